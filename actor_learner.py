@@ -0,0 +1,146 @@
+"""
+Actor/learner training for Predator2.
+
+Actor processes step many Predator2 episodes each with the vectorized kernel of
+predator_kernel.py, choosing the predators' actions epsilon-greedily from their own copy of
+a Q-value snapshot, and send the transitions to a queue in batches. The learner (the calling
+process) applies them to two hysteretic learners with update_batch and publishes the new
+Q-values to the snapshot, a shared_qtable.SharedQStore.
+
+Staleness, i.e. how far the actors' Q-values lag the learner's, is set by
+    refresh_interval: the number of steps an actor takes between two reads of the snapshot;
+    publish_interval: the number of transition batches the learner applies between two
+    publications;
+    max_queue: the number of batches that can wait in the queue; actors block when it is full.
+The snapshot versions the actors acted with are recorded, so the staleness reached is
+reported with the results.
+"""
+import multiprocessing
+import os
+import queue as queue_module
+import time
+
+import numpy as np
+
+from policy import epsilon_greedy_batch
+from runner import trial_seeds
+from shared_qtable import SharedQStore
+
+
+def _actor(seed, snapshot, transitions, stop, num_episodes, steps_per_batch, refresh_interval, exploration_rate):
+    from predator_kernel import PredatorBatch
+
+    shape = snapshot.shape
+    rng = np.random.default_rng(seed)
+    batch = PredatorBatch(num_episodes, rng)
+    q = np.empty(shape)
+    version = snapshot.read(q)
+    steps = 0
+    states = batch.get_states()
+    try:
+        while not stop.is_set():
+            collected = []
+            for _ in range(steps_per_batch):
+                epsilon = exploration_rate(steps) if callable(exploration_rate) else exploration_rate
+                actions = epsilon_greedy_batch(q[:, states], epsilon, rng).T
+                rewards, next_states, terminal = batch.step(actions)
+                collected.append((states, actions, rewards, next_states, terminal))
+                states = batch.get_states()
+                steps += 1
+                if steps % refresh_interval == 0:
+                    version = snapshot.read(q)
+            message = tuple(np.concatenate(column) for column in zip(*collected)) + (version,)
+            while not stop.is_set():
+                try:
+                    transitions.put(message, timeout=0.1)
+                    break
+                except queue_module.Full:
+                    pass
+    finally:
+        # on exit the queue's feeder thread flushes what was put; the learner drains it
+        snapshot.close()
+
+
+class ActorLearnerResult:
+    def __init__(self, learners, transitions, batches, versions, staleness, seconds, rewards):
+        self.learners = learners
+        self.transitions = transitions
+        self.batches = batches
+        self.versions = versions
+        self.staleness = staleness
+        self.seconds = seconds
+        self.rewards = rewards
+
+    @property
+    def transitions_per_second(self):
+        return self.transitions / self.seconds
+
+    def __repr__(self):
+        return "ActorLearnerResult({} transitions in {:.1f}s, {:.0f}/s, mean staleness {:.1f} versions)".format(
+            self.transitions, self.seconds, self.transitions_per_second, float(np.mean(self.staleness)))
+
+
+def run_actor_learner(total_transitions, num_actors=None, learning_rate=0.1, decrease_rate=0.01, discount_rate=0.9,
+                      exploration_rate=0.1, episodes_per_actor=256, steps_per_batch=16, refresh_interval=64,
+                      publish_interval=1, max_queue=8, seed=None, learners=None):
+    """
+    Trains two hysteretic predators on Predator2 until total_transitions transitions have
+    been applied. num_actors defaults to one less than the CPU count (at least 1).
+    learners: two encoded learners to continue training (e.g. loaded from a checkpoint); by
+    default new ones are built from the rates, which are numbers or schedules. The actors
+    evaluate a scheduled exploration rate at their own step count.
+
+    Returns an ActorLearnerResult with the learners, the number of transitions and batches
+    applied, the snapshot versions published, the staleness of every batch (in versions), the
+    wall time and the mean reward per batch.
+    """
+    from environment import Predator2
+    from HystereticQLearner import HystereticQLearner
+
+    task = Predator2()
+    if learners is None:
+        learners = [HystereticQLearner(task, exploration_rate, learning_rate, discount_rate, decrease_rate, encoded=True)
+                    for _ in range(2)]
+    if num_actors is None:
+        num_actors = max(1, (os.cpu_count() or 1) - 1)
+    context = multiprocessing.get_context()
+    snapshot = SharedQStore(2, *learners[0].q_table.array.shape, context=context)
+    snapshot.publish([learner.q_table.array for learner in learners])
+    transitions = context.Queue(max_queue)
+    stop = context.Event()
+    actors = [context.Process(target=_actor, daemon=True,
+                              args=(actor_seed, snapshot, transitions, stop, episodes_per_actor,
+                                    steps_per_batch, refresh_interval, exploration_rate))
+              for actor_seed in trial_seeds(seed, num_actors)]
+
+    applied = batches = 0
+    staleness = []
+    rewards = []
+    start = time.perf_counter()
+    for actor in actors:
+        actor.start()
+    try:
+        while applied < total_transitions:
+            states, actions, batch_rewards, next_states, _, actor_version = transitions.get()
+            for k, learner in enumerate(learners):
+                learner.update_batch(states, actions[:, k], next_states, batch_rewards)
+            applied += len(states)
+            batches += 1
+            staleness.append(snapshot.version - actor_version)
+            rewards.append(float(batch_rewards.mean()))
+            if batches % publish_interval == 0:
+                snapshot.publish([learner.q_table.array for learner in learners])
+    finally:
+        stop.set()
+        # unblock actors waiting on a full queue, then let them exit
+        while any(actor.is_alive() for actor in actors):
+            try:
+                transitions.get(timeout=0.05)
+            except queue_module.Empty:
+                pass
+        for actor in actors:
+            actor.join()
+        versions = snapshot.version
+        snapshot.close(unlink=True)
+    seconds = time.perf_counter() - start
+    return ActorLearnerResult(learners, applied, batches, versions, np.array(staleness), seconds, np.array(rewards))
@@ -1,10 +1,15 @@
-import numpy as np
 import random
-from environment import Environment
+from schedules import constant_value
+
+# NumPy and the Q-table modules are imported where they are used, and typing not at all, so
+# importing the agents (e.g. in every process of a worker pool) stays cheap
+TYPE_CHECKING = False
+if TYPE_CHECKING:
+	from environment import Environment
 
 
 class Agent:
-	def __init__(self, environment: Environment):
+	def __init__(self, environment: "Environment"):
 		self.accumulated_reward = 0
 		self.environment = environment
 		self.action = None
@@ -29,11 +34,31 @@ class TDLearner(Agent):
 		self.get_learning_rate = get_learning_rate
 		self.get_discount_rate = get_discount_rate
 		self.get_exploration_rate = get_exploration_rate
+		# rates that are numbers or constant schedules (see schedules.py) are read once here
+		# instead of being called on every update
+		self.learning_rate = constant_value(get_learning_rate)
+		self.discount_rate = constant_value(get_discount_rate)
+		# the TD error of the latest update, read by metrics recorders (see metrics.py)
+		self.td_error = 0.0
 
 class QLearner(TDLearner):
-	def __init__(self, environment, get_exploration_rate, get_learning_rate, get_discount_rate, policy=None):
+	def __init__(self, environment, get_exploration_rate, get_learning_rate, get_discount_rate, policy=None, dense=False, encoded=False, lazy=False, initial_value=0):
+		"""
+		dense: if True, keep the Q-values in an array-backed QTable instead of a dict of dicts.
+		q_values is then a dict-like view of that table.
+		encoded: if True, states and actions are the environment's integer codes
+		(see Environment.encode_state) and the table is indexed by them directly. Implies dense.
+		lazy: if True, a state's Q-values are created the first time the state is touched instead of
+		for the whole state space up front.
+		initial_value: the value every Q-value starts at.
+		"""
 		TDLearner.__init__(self, environment, get_exploration_rate, get_learning_rate, get_discount_rate)
 		self.q_values = None
+		self.q_table = None
+		self.dense = dense or encoded
+		self.encoded = encoded
+		self.lazy = lazy
+		self.initial_value = initial_value
 		self.init_action_values()
 		if(policy == None):
 			from policy import epsilon_greedy
@@ -46,42 +71,109 @@ class QLearner(TDLearner):
 			import warnings
 			warnings.warn("Overriding Q-Values....")
 
+		if(self.dense):
+			from qtable import make_q_table
+			self.q_table = make_q_table(self.environment, self.encoded, self.lazy, self.initial_value)
+			self.q_values = self.q_table
+			return
+
+		if(self.lazy):
+			from qtable import LazyQValues
+			self.q_values = LazyQValues(self.environment.get_action_space(), self.initial_value)
+			return
+
 		state_action_values = {}
-		for state in self.environment.get_state_space():
+		environment = self.environment
+		for state in environment.get_state_space():
 			temp = {}
-			for action in self.environment.action_space:
-				temp[action] = 0
+			action_space = environment.get_action_space()
+			possible_actions = action_space if not callable(action_space) else action_space(state)
+			for action in possible_actions:
+				temp[action] = self.initial_value
 			state_action_values[state] = temp
 		self.q_values = state_action_values
 
 	def action_selection(self, state=None, possible_actions=None, *args, **kwargs):
-		action_space = self.environment.action_space
-		action_values = np.zeros(len(action_space))
-		for i, action in enumerate(action_space):
-			action_values[i] = self.q_values[state][action]
-		action = self.policy(action_space, action_values, *args, **kwargs)
+		if(self.q_table is not None and possible_actions is None):
+			if(hasattr(self.policy, "select_from_table")):
+				action = self.policy.select_from_table(self.q_table, state, *args, **kwargs)
+			else:
+				action = self.policy(self.q_table.actions, self.q_table.row(state), *args, **kwargs)
+		else:
+			if(possible_actions is None):
+				action_space = self.environment.get_action_space()
+				possible_actions = action_space if not callable(action_space) else action_space(state)
+			values = self.q_values[state]
+			action_values = [values[action] for action in possible_actions]
+			action = self.policy(possible_actions, action_values, *args, **kwargs)
 		self.action = action
 		return action
 
 	def get_q_value(self, state, action):
+		if(self.q_table is not None):
+			return self.q_table.get_value(state, action)
 		return self.q_values[state][action]
 
 	def get_max_q_value(self, state):
+		if(self.q_table is not None):
+			return self.q_table.max_value(state)
 		return max(self.q_values[state].values())
 
 	def set_q_value(self, state, action, new_value):
-		self.q_values[state][action] = new_value
+		if(self.q_table is not None):
+			self.q_table.set_value(state, action, new_value)
+		else:
+			self.q_values[state][action] = new_value
+
+	def step_size(self, delta, t = None):
+		"""
+		The learning rate of an update whose TD error is delta; subclasses with other update
+		rules (e.g. HystereticQLearner) override it.
+		"""
+		return self.learning_rate if self.learning_rate is not None else self.get_learning_rate(t)
 
 	def update(self, state, action_taken, new_state, reward, t = None):
-		previous_state = state
-		action = action_taken
 		self.accumulated_reward += reward
-		q_value = self.get_q_value(previous_state, action)
-		target = reward + self.get_discount_rate(t) * self.get_max_q_value(new_state)
-		self.set_q_value(previous_state, action, q_value + self.get_learning_rate(t) * (target - q_value))
+		discount_rate = self.discount_rate if self.discount_rate is not None else self.get_discount_rate(t)
+		table = self.q_table
+		if(table is not None):
+			# each state is looked up once, then the table is addressed by index
+			# (both before reading: a lazy table's arrays are replaced when it grows)
+			index = table.index_of(state)
+			next_index = table.index_of(new_state)
+			action_index = table.action_index[action_taken]
+			q_value = table.array.item(index, action_index)
+			delta = reward + discount_rate * table.max_values.item(next_index) - q_value
+			self.td_error = delta
+			table.set_index_value(index, action_index, q_value + self.step_size(delta, t) * delta)
+			return
+		values = self.q_values[state]
+		q_value = values[action_taken]
+		delta = reward + discount_rate * max(self.q_values[new_state].values()) - q_value
+		self.td_error = delta
+		values[action_taken] = q_value + self.step_size(delta, t) * delta
+
+	def update_batch(self, states, actions, next_states, rewards, t = None):
+		"""
+		Same as calling update on each transition in order, with the rates at t. With a dense
+		Q-table the transitions are applied in vectorized passes (see QTable.update_batch).
+		"""
+		if(self.q_table is None):
+			for state, action, new_state, reward in zip(states, actions, next_states, rewards):
+				self.update(state, action, new_state, reward, t)
+			return
+		table = self.q_table
+		discount_rate = self.discount_rate if self.discount_rate is not None else self.get_discount_rate(t)
+		# the step sizes of positive and negative TD errors
+		deltas = table.update_batch(table.indices_of(states), table.action_indices_of(actions), table.indices_of(next_states),
+									rewards, self.step_size(1.0, t), self.step_size(-1.0, t), discount_rate)
+		import numpy as np
+		self.accumulated_reward += float(np.sum(rewards))
+		if(len(deltas)):
+			self.td_error = float(deltas[-1])
   
 class FixedAgent(Agent):
-	def __init__(self, environment: Environment, fixed_choice):
+	def __init__(self, environment: "Environment", fixed_choice):
 		self.accumulated_reward = 0
 		self.environment = environment
 		if(fixed_choice not in environment.action_space):
@@ -0,0 +1,26 @@
+"""
+Writing files that other processes may be reading.
+
+replace_file writes to a temporary file next to the target and renames it over the target,
+so a reader opens either the old file or the new one, never a partial file. Used by
+checkpoint.py, compiled.py (the cached environment tables) and result_store.py.
+"""
+import os
+import threading
+
+
+def replace_file(path, write):
+    """
+    Calls write(f) with a binary file object, then moves the written file to path. If write
+    raises, path is left as it was.
+    """
+    # unique per process and thread, so concurrent writers of the same path don't share one
+    temp_path = "{}.{}.{}.tmp".format(path, os.getpid(), threading.get_ident())
+    f = open(temp_path, "wb")
+    try:
+        with f:
+            write(f)
+        os.replace(temp_path, path)
+    except BaseException:
+        os.remove(temp_path)
+        raise
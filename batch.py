@@ -0,0 +1,97 @@
+"""
+Runs many independent trials of a two-player tabular game in lockstep.
+
+Every trial has its own pair of (hysteretic) Q-learners. The Q-tables of all trials are
+held in one array of shape (num_agents, num_trials, num_states, num_actions), so each
+timestep costs a handful of NumPy operations regardless of how many trials are running.
+"""
+import numpy as np
+
+import boltzmann
+from compiled import CompiledEnvironment
+from policy import epsilon_greedy_batch
+from schedules import as_array
+
+
+def simulate_batch(task, num_trials, timesteps, learning_rate, decrease_rate=None, discount_rate=0,
+                   system_temperature=None, temperature_decay=0.99, exploration_rate=None,
+                   seed=None, return_q_values=False, replay=None):
+    """
+    Runs num_trials independent trials of two learners on task for timesteps steps.
+    task is a two-player environment that can be compiled (see Environment.compile), or an
+    already compiled one.
+
+    learning_rate, decrease_rate, discount_rate and exploration_rate are numbers, schedules
+    (see schedules.py) or callables of t; all are evaluated for every t up front.
+    decrease_rate=None gives plain (decentralized) Q-learning.
+    With system_temperature set, actions are chosen by Boltzmann selection. A number is
+    multiplied by temperature_decay after every step, as in simulate_task; a schedule gives
+    the temperature at each t. Otherwise epsilon-greedy selection with exploration_rate is used.
+
+    Returns the (num_trials, timesteps) reward matrix the notebooks build: entry [i, t] is the
+    reward accumulated over the episode of trial i that ended at step t, and 0 elsewhere.
+    With return_q_values, also returns the (2, num_trials, num_states, num_actions) Q-values.
+    replay: a replay.ReplayBuffer (holding codes) every trial's transitions are added to.
+    """
+    if system_temperature is None and exploration_rate is None:
+        raise ValueError("Either system_temperature or exploration_rate must be given")
+
+    compiled = task if isinstance(task, CompiledEnvironment) else task.compile()
+    if compiled.num_agents != 2:
+        raise ValueError("simulate_batch needs a two-player environment")
+    next_states = compiled.next_states
+    reward_values = compiled.reward_values
+    reward_counts = compiled.reward_counts
+    terminal = compiled.terminal
+    start = compiled.start_code
+    num_agents = 2
+
+    rng = np.random.default_rng(seed)
+
+    learning_rates = as_array(learning_rate, timesteps)
+    decrease_rates = learning_rates if decrease_rate is None else as_array(decrease_rate, timesteps)
+    discount_rates = as_array(discount_rate, timesteps)
+    if system_temperature is None:
+        exploration_rates = as_array(exploration_rate, timesteps)
+        temperatures = None
+    elif callable(system_temperature):
+        temperatures = as_array(system_temperature, timesteps)
+    else:
+        temperatures = system_temperature * temperature_decay ** np.arange(timesteps, dtype=float)
+
+    trials = np.arange(num_trials)
+    agents = np.arange(num_agents)[:, None]
+    q = np.zeros((num_agents, num_trials, task.num_states, task.num_actions))
+    rewards = np.zeros((num_trials, timesteps))
+    episode_reward = np.zeros(num_trials)
+    state = np.full(num_trials, start, dtype=np.intp)
+
+    for t in range(timesteps):
+        values = q[:, trials, state]
+        if temperatures is not None:
+            actions = boltzmann.sample(values, temperatures[t], rng)
+        else:
+            actions = epsilon_greedy_batch(values, exploration_rates[t], rng)
+
+        a1, a2 = actions
+        new_state = next_states[state, a1, a2]
+        outcome = (rng.random(num_trials) * reward_counts[state, a1, a2]).astype(np.intp)
+        reward = reward_values[state, a1, a2, outcome]
+
+        target = reward + discount_rates[t] * q[:, trials, new_state].max(axis=-1)
+        old = q[agents, trials, state, actions]
+        delta = target - old
+        q[agents, trials, state, actions] = old + delta * np.where(delta >= 0, learning_rates[t], decrease_rates[t])
+
+        if replay is not None:
+            replay.add_batch(state, actions.T, reward, new_state, terminal[new_state])
+
+        episode_reward += reward
+        done = terminal[new_state] | (t == timesteps - 1)
+        rewards[done, t] = episode_reward[done]
+        episode_reward[done] = 0
+        state = np.where(done, start, new_state)
+
+    if return_q_values:
+        return rewards, q
+    return rewards
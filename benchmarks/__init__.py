@@ -0,0 +1,9 @@
+"""
+Benchmarks for the hot paths of the agents, policies and environments.
+
+Run from the repository root:
+    python -m benchmarks                       # run everything and print a table
+    python -m benchmarks -k predator           # only benchmarks whose name contains "predator"
+    python -m benchmarks -o results.json       # also save machine-readable results
+    python -m benchmarks --compare old.json    # show the change against a saved run
+"""
@@ -0,0 +1,73 @@
+import argparse
+import json
+import platform
+import subprocess
+import sys
+import time
+
+from benchmarks.suite import BENCHMARKS
+from benchmarks.timing import measure
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_table(results, baseline):
+    header = "{:<58} {:>12} {:>9} {:>9} {:>9} {:>10}".format(
+        "benchmark", "steps/s", "p50 us", "p90 us", "p99 us", "peak KiB")
+    if baseline:
+        header += " {:>8}".format("vs base")
+    print(header)
+    for result in results:
+        latency = result["latency_us"]
+        line = "{:<58} {:>12.0f} {:>9.2f} {:>9.2f} {:>9.2f} {:>10.0f}".format(
+            result["name"], result["steps_per_second"], latency["p50"], latency["p90"], latency["p99"],
+            result["peak_memory_bytes"] / 1024)
+        if baseline:
+            previous = baseline.get(result["name"])
+            # > 1 means faster than the baseline
+            line += " {:>7.2f}x".format(result["steps_per_second"] / previous["steps_per_second"]) if previous else " {:>8}".format("new")
+        print(line)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m benchmarks", description="Time the hot paths.")
+    parser.add_argument("-k", "--filter", default="", help="only run benchmarks whose name contains this")
+    parser.add_argument("-o", "--output", help="save the results as JSON to this file")
+    parser.add_argument("--compare", help="a JSON file saved by a previous run to compare against")
+    parser.add_argument("--scale", type=float, default=1.0, help="multiply the number of calls")
+    args = parser.parse_args(argv)
+
+    results = []
+    for name, setup, calls, steps_per_call in BENCHMARKS:
+        if args.filter.lower() not in name.lower():
+            continue
+        calls = max(1, int(calls * args.scale))
+        results.append(measure(name, setup, calls, steps_per_call).to_dict())
+        print("ran {}".format(name), file=sys.stderr)
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = {result["name"]: result for result in json.load(f)["results"]}
+    print_table(results, baseline)
+
+    if args.output:
+        report = {
+            "commit": git_commit(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "results": results,
+        }
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,202 @@
+"""
+Benchmark definitions. Each entry of BENCHMARKS is (name, setup, calls, steps_per_call); see
+benchmarks.timing.measure.
+"""
+import itertools
+import os
+import random
+import subprocess
+import sys
+
+import boltzmann
+from agent import QLearner
+from batch import simulate_batch
+from environment import Boutilier, ClimbingGame, GridWorld, PenaltyGame, Predator, Predator2
+from HystereticQLearner import HystereticQLearner
+from multiagent import AgentGroup
+from policy import epsilon_greedy
+from schedules import Constant
+from utils import simulate_task
+
+
+def make_learner(cls, task, policy=None, **kwargs):
+    if cls is HystereticQLearner:
+        return HystereticQLearner(task, 0.1, Constant(0.1), Constant(0.9), Constant(0.01), policy, **kwargs)
+    return QLearner(task, 0.1, Constant(0.1), Constant(0.9), policy, **kwargs)
+
+
+def predator_transitions(task, count=4096):
+    random.seed(0)
+    states = task.get_state_space()
+    actions = task.action_space
+    return [(states[random.randrange(len(states))], random.choice(actions),
+             states[random.randrange(len(states))], random.choice((0, 0, 0, 10, -50)))
+            for _ in range(count)]
+
+
+# Agents
+def update_setup(cls, **kwargs):
+    def setup():
+        task = Predator2()
+        agent = make_learner(cls, task, **kwargs)
+        transitions = itertools.cycle(predator_transitions(task))
+
+        def fn():
+            agent.update(*next(transitions))
+        return fn
+    return setup
+
+
+def action_selection_setup(cls, policy_name, **kwargs):
+    def setup():
+        task = Predator2()
+        policy = boltzmann.selection if policy_name == "boltzmann" else epsilon_greedy(0.1)
+        agent = make_learner(cls, task, policy, **kwargs)
+        for transition in predator_transitions(task):
+            agent.update(*transition)
+        states = itertools.cycle([transition[0] for transition in predator_transitions(task)])
+
+        def fn():
+            agent.action_selection(next(states), None, 5.0)
+        return fn
+    return setup
+
+
+def group_step_setup(num_agents, batch):
+    def setup():
+        task = Predator2()
+        group = AgentGroup([make_learner(HystereticQLearner, task, dense=True) for _ in range(num_agents)], batch=batch)
+        transitions = itertools.cycle(predator_transitions(task))
+
+        def fn():
+            state, _, new_state, reward = next(transitions)
+            group.update(state, group.act(state, 5.0), new_state, reward)
+        return fn
+    return setup
+
+
+# Environments
+def respond_setup(make_task, joint_action):
+    def setup():
+        task = make_task()
+        start = task.start_state() if callable(task.start_state) else task.start_state
+
+        def fn():
+            reward, state = task.respond_to_action(joint_action)
+            if task.isTerminalState(state):
+                # keep stepping from a live state
+                if isinstance(task, Predator2):
+                    task.current_true_state = task.get_new_start_state()
+                else:
+                    task.current_state = start
+        return fn
+    return setup
+
+
+def grid_world(n=50):
+    return GridWorld(n, (0, 0), [(n - 1, n - 1), (n // 2, n - 1)])
+
+
+def grid_batch_setup(n, num_episodes):
+    def setup():
+        from grid_kernel import GridWorldBatch
+        import numpy as np
+
+        batch = GridWorldBatch(grid_world(n), num_episodes)
+        rng = np.random.default_rng(0)
+        actions = itertools.cycle([rng.integers(0, 4, num_episodes) for _ in range(64)])
+
+        def fn():
+            batch.step(next(actions))
+        return fn
+    return setup
+
+
+# End to end
+def simulate_setup(make_task, make_agents, timesteps, system_temperature=None):
+    def setup():
+        def fn():
+            task = make_task()
+            agents = make_agents(task)
+            T = system_temperature
+            t = 0
+            while t < timesteps:
+                t, T = simulate_task(agents, task, t, T, timesteps=timesteps)
+                agents[0].accumulated_reward = 0
+                if isinstance(task, (Boutilier, GridWorld)):
+                    task.reset_state()
+        return fn
+    return setup
+
+
+def hysteretic_pair(policy=None, **kwargs):
+    def make_agents(task):
+        return [make_learner(HystereticQLearner, task, policy, **kwargs) for _ in range(2)]
+    return make_agents
+
+
+def grid_world_setup(timesteps):
+    def make_agents(task):
+        return [make_learner(HystereticQLearner, task, epsilon_greedy(0.1))]
+    return simulate_setup(grid_world, make_agents, timesteps)
+
+
+# Startup
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def import_setup(modules):
+    # a fresh interpreter per call, as a spawned worker or a CLI run pays it
+    code = "import {}".format(", ".join(modules)) if modules else "pass"
+
+    def setup():
+        def fn():
+            subprocess.run([sys.executable, "-c", code], cwd=ROOT, check=True)
+        return fn
+    return setup
+
+
+def batch_setup():
+    def fn():
+        simulate_batch(ClimbingGame(), 100, 3000, 0.1, 0.01, 0, system_temperature=5000, seed=0)
+    return fn
+
+
+BENCHMARKS = [
+    ("QLearner.update predator2 dict", update_setup(QLearner), 20000, 1),
+    ("QLearner.update predator2 dense", update_setup(QLearner, dense=True), 20000, 1),
+    ("HystereticQLearner.update predator2 dict", update_setup(HystereticQLearner), 20000, 1),
+    ("HystereticQLearner.update predator2 dense", update_setup(HystereticQLearner, dense=True), 20000, 1),
+    ("QLearner.action_selection epsilon_greedy", action_selection_setup(QLearner, "epsilon"), 20000, 1),
+    ("QLearner.action_selection boltzmann", action_selection_setup(QLearner, "boltzmann"), 20000, 1),
+    ("HystereticQLearner.action_selection epsilon_greedy", action_selection_setup(HystereticQLearner, "epsilon"), 20000, 1),
+    ("HystereticQLearner.action_selection epsilon_greedy dense",
+     action_selection_setup(HystereticQLearner, "epsilon", dense=True), 20000, 1),
+    ("HystereticQLearner.action_selection boltzmann", action_selection_setup(HystereticQLearner, "boltzmann"), 20000, 1),
+    ("AgentGroup step 2 agents", group_step_setup(2, False), 20000, 1),
+    ("AgentGroup step 32 agents", group_step_setup(32, False), 2000, 1),
+    ("AgentGroup step 32 agents batched", group_step_setup(32, True), 20000, 1),
+    ("ClimbingGame.respond_to_action", respond_setup(ClimbingGame, ('A', 'B')), 20000, 1),
+    ("ClimbingGame.respond_to_action full_stochastic",
+     respond_setup(lambda: ClimbingGame(full_stochastic=True), ('A', 'B')), 20000, 1),
+    ("PenaltyGame.respond_to_action", respond_setup(lambda: PenaltyGame(-100), ('A', 'C')), 20000, 1),
+    ("Boutilier.respond_to_action", respond_setup(lambda: Boutilier(-100, True), ('a', 'a')), 20000, 1),
+    ("Predator.respond_to_action", respond_setup(Predator, ('left', 'up')), 20000, 1),
+    ("Predator2.respond_to_action", respond_setup(Predator2, ('left', 'up')), 20000, 1),
+    ("GridWorld.respond_to_action 50x50", respond_setup(grid_world, 'right'), 20000, 1),
+    ("GridWorld.respond_to_action 1000x1000", respond_setup(lambda: grid_world(1000), 'right'), 20000, 1),
+    ("GridWorldBatch.step 1000x1000 4096 walkers", grid_batch_setup(1000, 4096), 2000, 4096),
+    ("simulate_task ClimbingGame boltzmann",
+     simulate_setup(ClimbingGame, hysteretic_pair(boltzmann.selection), 3000, 5000), 3, 3000),
+    ("simulate_task Boutilier epsilon_greedy",
+     simulate_setup(lambda: Boutilier(-100), hysteretic_pair(epsilon_greedy(0.05)), 4000), 3, 4000),
+    ("simulate_task Predator2 epsilon_greedy", simulate_setup(Predator2, hysteretic_pair(), 5000), 3, 5000),
+    ("GridWorld 50x50 episodes epsilon_greedy", grid_world_setup(5000), 3, 5000),
+    ("simulate_batch ClimbingGame 100 trials", batch_setup, 3, 100 * 3000),
+    ("startup python", import_setup([]), 10, 1),
+    ("startup import typing", import_setup(["typing"]), 10, 1),
+    ("startup import agent environment policy utils", import_setup(["agent", "environment", "policy", "utils"]), 10, 1),
+    ("startup import HystereticQLearner", import_setup(["HystereticQLearner"]), 10, 1),
+    ("startup import boltzmann", import_setup(["boltzmann"]), 10, 1),
+    ("startup import runner", import_setup(["runner"]), 10, 1),
+]
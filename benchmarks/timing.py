@@ -0,0 +1,66 @@
+import time
+import tracemalloc
+
+import numpy as np
+
+
+class Result:
+    def __init__(self, name, calls, steps_per_call, latencies_ns, peak_memory):
+        self.name = name
+        self.calls = calls
+        self.steps_per_call = steps_per_call
+        self.latencies_ns = latencies_ns
+        self.peak_memory = peak_memory
+
+    @property
+    def total_seconds(self):
+        return float(self.latencies_ns.sum()) / 1e9
+
+    @property
+    def steps_per_second(self):
+        return self.calls * self.steps_per_call / self.total_seconds
+
+    def percentile_us(self, q):
+        return float(np.percentile(self.latencies_ns, q)) / 1e3
+
+    def to_dict(self):
+        return {
+            "name": self.name,
+            "calls": self.calls,
+            "steps_per_call": self.steps_per_call,
+            "steps_per_second": self.steps_per_second,
+            "latency_us": {
+                "p50": self.percentile_us(50),
+                "p90": self.percentile_us(90),
+                "p99": self.percentile_us(99),
+                "mean": float(self.latencies_ns.mean()) / 1e3,
+            },
+            "peak_memory_bytes": self.peak_memory,
+        }
+
+
+def measure(name, setup, calls, steps_per_call=1, warmup=None):
+    """
+    setup() builds fresh state and returns the function to time, called with no arguments.
+    The function is called `calls` times, each call timed on its own. Peak memory (setup
+    included) is measured in a separate run, since tracing slows every allocation down.
+    steps_per_call: how many environment/agent steps one call stands for, for steps/sec.
+    """
+    fn = setup()
+    for _ in range(warmup if warmup is not None else min(calls // 10, 1000)):
+        fn()
+    latencies = np.empty(calls, dtype=np.int64)
+    clock = time.perf_counter_ns
+    for i in range(calls):
+        start = clock()
+        fn()
+        latencies[i] = clock() - start
+
+    tracemalloc.start()
+    fn = setup()
+    for _ in range(min(calls, 1000)):
+        fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return Result(name, calls, steps_per_call, latencies, peak)
@@ -1,31 +1,65 @@
-from math import e
-from scipy.constants import k
+from math import exp
 import numpy as np
-from decimal import Decimal
 
-# Q is list of the estimated value of choosing each action
+# Q is list (or array) of the estimated value of choosing each action
 # T is the system temperature
 def boltzmann_distribution(Q, T):
-    highInf = 0
-    highInfIndex = -1
-    # Check if any/multiple expected values would result in infinity, remember the highest
-    for i,x in enumerate(Q):
-        if e**(x/T) == np.Infinity and x > highInf:
-            highInf = x
-            highInfIndex = i
+    """
+    Returns the probabilities e**(Q/T) / sum(e**(Q/T)) over the last axis of Q, so Q may also
+    be a batch of shape (..., num_actions). T is a number, or an array of shape Q.shape[:-1].
 
-    if highInf != 0 and highInfIndex != -1:
-        P = np.zeros(len(Q))
-        P[highInfIndex] = 1
-        return P
+    Computed in log-sum-exp form, e**((Q - max Q)/T), which cannot overflow. As T decays
+    toward 0 the distribution tends to uniform over the greedy actions, and T == 0 gives
+    exactly that.
+    """
+    Q = np.asarray(Q, dtype=float)
+    T = np.asarray(T, dtype=float)
+    if T.ndim:
+        T = T[..., None]
+    Q_max = Q.max(axis=-1, keepdims=True)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        logits = np.where(Q == Q_max, 0.0, (Q - Q_max) / T)
+    P = np.exp(logits)
+    return P / P.sum(axis=-1, keepdims=True)
 
-    P = [e**(x/T) for x in Q]
-    # Calculate canonical partition function, divide all probabilities by it so sum <= 1
-    CPF = sum(P)
-    P[:] = [x / CPF for x in P]
-
-    return P                    # Return array of probabilities
+def sample(Q, T, rng=None):
+    """
+    Samples one action index per row of Q (shape (..., num_actions)) by inverting the CDF
+    of the Boltzmann distribution. rng is a numpy Generator; the global np.random is used
+    when it is None.
+    """
+    P = boltzmann_distribution(Q, T)
+    cdf = np.cumsum(P, axis=-1)
+    u = (np.random.random if rng is None else rng.random)(P.shape[:-1] + (1,))
+    return np.minimum((cdf <= u * cdf[..., -1:]).sum(axis=-1), P.shape[-1] - 1)
 
 # A is list of actions, Q is estimated value of each action, T is system temperature
-def selection(A, Q, T):
-    return np.random.choice(A, p=boltzmann_distribution(Q, T))
\ No newline at end of file
+def selection(A, Q, T, rng=None, t=None):
+    """
+    Samples one action from A at system temperature T (t, the timestep, is not used). For a single state this runs on plain floats, which is much
+    cheaper than NumPy calls on a handful of actions; use sample() for batches.
+    """
+    values = Q.tolist() if isinstance(Q, np.ndarray) else Q
+    q_max = max(values)
+    if T > 0:
+        weights = [exp((q - q_max) / T) for q in values]
+    else:
+        weights = [1.0 if q == q_max else 0.0 for q in values]
+
+    u = (np.random.random() if rng is None else rng.random()) * sum(weights)
+    cumulative = 0.0
+    chosen = 0
+    for i, weight in enumerate(weights):
+        if weight > 0:
+            chosen = i
+            cumulative += weight
+            if u < cumulative:
+                break
+    return A[chosen]
+
+def _temperature(T, *args, t=None):
+    return T
+
+# lets multiagent.AgentGroup sample the actions of many agents at once (see policy.epsilon_greedy)
+selection.select_batch = sample
+selection.batch_parameter = _temperature
@@ -0,0 +1,148 @@
+"""
+Saves and loads a learner's state: its Q-values, the timestep t its rate schedules had
+reached, and the state of the global random generators the policies and environments draw from.
+
+A checkpoint is a directory holding
+    q-<id>.npy: the Q-values as one (num_states, num_actions) float array;
+    meta.pkl: the name of that file, the state and action lists, t, the random generator
+    states and what kind of table the agent used.
+The Q file is a plain .npy file, so load_agent can memory-map it instead of reading it:
+loading a Predator2 table takes milliseconds, and every process that maps the same file
+read-only shares one copy of it in the page cache.
+
+Saving over a checkpoint writes the Q-values to a new file, then replaces meta.pkl in one
+rename, so a reader always gets the Q-values meta.pkl names. The Q file of the previous save
+is deleted by the next one, which leaves readers of the previous meta.pkl time to open it.
+
+Rates, discount and policies are code, not state: rebuild the agent as it was built for
+training, then load the checkpoint into it.
+"""
+import glob
+import os
+import pickle
+import random
+
+import numpy as np
+
+from atomic import replace_file
+from qtable import EncodedQTable, LazyQTable, QTable
+
+META_FILE = "meta.pkl"
+
+
+def save_agent(path, agent, t=0, save_random_state=True):
+    """
+    Writes agent's Q-values to the checkpoint directory path. t is the timestep training
+    reached, returned by load_agent to resume the rate schedules where they were.
+    """
+    q_table = getattr(agent, "q_table", None)
+    if q_table is None:
+        # dict-of-dicts Q-values: only the states present (all of them, unless lazy)
+        states = list(agent.q_values)
+        action_space = agent.environment.get_action_space()
+        actions = list(action_space) if not callable(action_space) else sorted(
+            {action for values in agent.q_values.values() for action in values}, key=repr)
+        array = np.full((len(states), len(actions)), np.nan)
+        for i, state in enumerate(states):
+            values = agent.q_values[state]
+            for j, action in enumerate(actions):
+                if action in values:
+                    array[i, j] = values[action]
+        kind = "dict"
+    elif isinstance(q_table, EncodedQTable):
+        states, actions, array, kind = None, q_table.actions, q_table.array, "encoded"
+    elif isinstance(q_table, LazyQTable):
+        states, actions, kind = q_table.states, q_table.actions, "lazy"
+        array = q_table.array[:len(states)]
+    else:
+        states, actions, array, kind = q_table.states, q_table.actions, q_table.array, "dense"
+
+    # a fresh name per save; os.urandom leaves the random state being saved untouched
+    q_file = "q-{}.npy".format(os.urandom(8).hex())
+    meta = {
+        "q_file": q_file,
+        "agent": type(agent).__name__,
+        "kind": kind,
+        "states": states,
+        "actions": actions,
+        "t": t,
+        "initial_value": getattr(agent, "initial_value", 0),
+        "accumulated_reward": agent.accumulated_reward,
+        "random_state": random.getstate() if save_random_state else None,
+        "numpy_random_state": np.random.get_state() if save_random_state else None,
+    }
+    os.makedirs(path, exist_ok=True)
+    try:
+        previous = load_meta(path)["q_file"]
+    except FileNotFoundError:
+        previous = None
+    old_files = [name for name in map(os.path.basename, glob.glob(os.path.join(path, "q-*.npy"))) if name != previous]
+    replace_file(os.path.join(path, q_file), lambda f: np.save(f, np.ascontiguousarray(array)))
+    # meta.pkl last: until it is replaced, readers still get the previous save
+    replace_file(os.path.join(path, META_FILE), lambda f: pickle.dump(meta, f, protocol=pickle.HIGHEST_PROTOCOL))
+    for name in old_files:
+        os.remove(os.path.join(path, name))
+
+
+def load_meta(path):
+    with open(os.path.join(path, META_FILE), "rb") as f:
+        return pickle.load(f)
+
+
+def load_q_array(path, mmap_mode="r", meta=None):
+    """
+    Returns the checkpoint's Q-value array, memory-mapped unless mmap_mode is None. meta:
+    the checkpoint's load_meta, read again if not given.
+    """
+    if meta is None:
+        meta = load_meta(path)
+    return np.load(os.path.join(path, meta["q_file"]), mmap_mode=mmap_mode)
+
+
+def load_agent(path, agent, mmap_mode="r", restore_random_state=False):
+    """
+    Loads the checkpoint at path into agent, which must have been built like the saved one
+    (same class of environment, same dense/encoded/lazy options). Returns the saved t.
+
+    mmap_mode is passed to np.load for a dense agent:
+        "r": the table is the read-only mapped file, shared between processes. Enough for greedy
+            evaluation; updating the agent raises an error.
+        "c": copy-on-write. Pages are shared until the agent writes to them, so warm-starting a
+            training run copies only the rows it updates. The file is never modified.
+        None: the table is read into memory.
+    Agents with dict-of-dicts Q-values always get a copy.
+
+    restore_random_state: also restore the global `random` and `np.random` states, so a
+    resumed run continues the saved one exactly.
+    """
+    meta = load_meta(path)
+    q_table = getattr(agent, "q_table", None)
+    dense_kind = None if q_table is None else "encoded" if isinstance(q_table, EncodedQTable) else \
+        "lazy" if isinstance(q_table, LazyQTable) else "dense"
+    if dense_kind is not None and dense_kind != meta["kind"]:
+        raise ValueError("Checkpoint {} holds a {} table, the agent uses a {} one".format(path, meta["kind"], dense_kind))
+
+    if dense_kind is None:
+        array = load_q_array(path, None, meta)
+        q_values = agent.q_values
+        q_values.clear()
+        for state, row in zip(meta["states"], array.tolist()):
+            q_values[state] = {action: value for action, value in zip(meta["actions"], row) if value == value}
+    else:
+        array = load_q_array(path, mmap_mode, meta)
+        if dense_kind == "encoded":
+            if array.shape != q_table.array.shape:
+                raise ValueError("Checkpoint {} has shape {}, the agent's table {}".format(path, array.shape, q_table.array.shape))
+            table = EncodedQTable.from_array(array)
+        elif dense_kind == "lazy":
+            table = LazyQTable.from_array(meta["states"], meta["actions"], array, meta["initial_value"])
+        else:
+            table = QTable.from_array(meta["states"], meta["actions"], array)
+        agent.q_table = table
+        agent.q_values = table
+
+    agent.accumulated_reward = meta["accumulated_reward"]
+    if restore_random_state and meta["random_state"] is not None:
+        random.setstate(meta["random_state"])
+        np.random.set_state(meta["numpy_random_state"])
+    return meta["t"]
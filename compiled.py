@@ -0,0 +1,157 @@
+"""
+Transition/reward tables for small, fully enumerable environments.
+
+Environment.compile() enumerates every (state, joint action) pair reachable from the start
+state once, through Environment.enumerate_outcomes, and stores:
+    next_states:   (num_states,) + (num_actions,) * num_agents, next state codes
+    reward_values: next_states.shape + (max_outcomes,), equally likely rewards (padded)
+    reward_counts: next_states.shape, how many of reward_values are real outcomes
+    terminal:      (num_states,), terminal flags
+Stepping a CompiledEnvironment is then a table lookup plus one random draw.
+"""
+import hashlib
+import os
+from itertools import product
+from random import random
+
+import numpy as np
+
+from atomic import replace_file
+from environment import Environment
+
+
+def environment_key(environment):
+    """
+    Fingerprint of an environment's configuration, used to validate cached tables.
+    """
+    return hashlib.sha1(repr(environment.describe()).encode()).hexdigest()
+
+
+def build_tables(environment):
+    if hasattr(environment, "transition_tables"):
+        # environments with an arithmetic layout build their tables with array operations
+        return environment.transition_tables()
+    num_states = environment.num_states
+    num_actions = environment.num_actions
+    num_agents = environment.num_agents
+    shape = (num_states,) + (num_actions,) * num_agents
+
+    terminal = np.zeros(num_states, dtype=bool)
+    # Unreachable states keep a self-loop with reward 0
+    next_states = np.broadcast_to(
+        np.arange(num_states).reshape((-1,) + (1,) * num_agents), shape).copy()
+    outcomes = {}
+
+    start = environment.start_state() if callable(environment.start_state) else environment.start_state
+    frontier = [start]
+    visited = {start}
+    while frontier:
+        state = frontier.pop()
+        code = environment.encode_state(state)
+        if environment.isTerminalState(state):
+            terminal[code] = True
+            continue
+        for joint in product(range(num_actions), repeat=num_agents):
+            actions = tuple(environment.action_space[a] for a in joint)
+            new_state, rewards = environment.enumerate_outcomes(state, actions if num_agents > 1 else actions[0])
+            next_states[(code,) + joint] = environment.encode_state(new_state)
+            outcomes[(code,) + joint] = rewards
+            if new_state not in visited:
+                visited.add(new_state)
+                frontier.append(new_state)
+
+    max_outcomes = max(len(rewards) for rewards in outcomes.values())
+    reward_values = np.zeros(shape + (max_outcomes,))
+    reward_counts = np.ones(shape, dtype=np.intp)
+    for index, rewards in outcomes.items():
+        reward_values[index] = rewards + (rewards[-1],) * (max_outcomes - len(rewards))
+        reward_counts[index] = len(rewards)
+
+    return {
+        "next_states": next_states,
+        "reward_values": reward_values,
+        "reward_counts": reward_counts,
+        "terminal": terminal,
+        "start": np.array(environment.encode_state(start)),
+    }
+
+
+def load_tables(path, key):
+    if not os.path.exists(path):
+        return None
+    with np.load(path) as data:
+        if str(data["key"]) != key:
+            return None
+        return {name: data[name] for name in data.files if name != "key"}
+
+
+def save_tables(path, key, tables):
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    replace_file(path, lambda f: np.savez(f, key=np.array(key), **tables))
+
+
+class CompiledEnvironment(Environment):
+    """
+    Table-driven version of a tabular environment. States and actions can be used either
+    as the source environment's values or as integer codes (see Environment.encode_state).
+    """
+
+    def __init__(self, source, tables):
+        Environment.__init__(self, source.get_state_space(), source.get_action_space(), source.start_state)
+        self.source = source
+        self.num_agents = source.num_agents
+        self.next_states = tables["next_states"]
+        self.reward_values = tables["reward_values"]
+        self.reward_counts = tables["reward_counts"]
+        self.terminal = tables["terminal"]
+        self.start_code = int(tables["start"])
+        self.current_code = self.start_code
+
+    def describe(self):
+        return self.source.describe()
+
+    def encode_state(self, state):
+        return self.source.encode_state(state)
+
+    def decode_state(self, code):
+        return self.source.decode_state(code)
+
+    def encoded_start_state(self):
+        self.current_code = self.start_code
+        return self.start_code
+
+    def reset_state(self):
+        Environment.reset_state(self)
+        self.current_code = self.start_code
+
+    def respond_to_action_encoded(self, action):
+        """
+        action: a tuple of action codes, one per agent (or one code for a single agent).
+        Returns reward, new_state_code
+        """
+        if self.terminal[self.current_code]:
+            # like simulate_task, a new episode starts from the start state
+            self.current_code = self.start_code
+        index = (self.current_code,) + (action if isinstance(action, tuple) else (action,))
+        count = self.reward_counts[index]
+        reward = self.reward_values[index + (int(random() * count) if count > 1 else 0,)]
+        self.current_code = int(self.next_states[index])
+        return reward.item(), self.current_code
+
+    def respond_to_action(self, action):
+        if self.num_agents == 1:
+            codes = self.encode_action(action)
+        else:
+            codes = tuple(self.encode_action(a) for a in action)
+        reward, code = self.respond_to_action_encoded(codes)
+        self.previous_state = self.current_state
+        self.current_state = self.decode_state(code)
+        return reward, self.current_state
+
+    def is_terminal_encoded(self, code):
+        return self.terminal[code]
+
+    def isTerminalState(self, state):
+        return self.terminal[self.encode_state(state)]
@@ -1,7 +1,11 @@
+from collections.abc import Sequence
 from random import randint, randrange, random, sample, choice
 
 
 class Environment:
+    # how many agents act jointly in respond_to_action
+    num_agents = 2
+
     def __init__(self, search_space, action_space, start_state):
         self.search_space = search_space
         self.action_space = action_space
@@ -35,6 +39,93 @@ class Environment:
         self.previous_state = self.start_state
         self.current_state = self.start_state
 
+    # Integer encoding
+    # States and actions can also be passed around as integer codes: states as
+    # indices into get_state_space() and actions as indices into the action space.
+    # Subclasses with arithmetic layouts override encode_state/decode_state and
+    # respond_to_action_encoded to skip the tuple hashing and string comparisons.
+    def _build_state_codes(self):
+        self._state_codes = {state: i for i, state in enumerate(self.get_state_space())}
+
+    @property
+    def num_states(self):
+        return len(self.get_state_space())
+
+    @property
+    def num_actions(self):
+        return len(self.action_space)
+
+    def encode_state(self, state):
+        if not hasattr(self, "_state_codes"):
+            self._build_state_codes()
+        return self._state_codes[state]
+
+    def decode_state(self, code):
+        return self.get_state_space()[code]
+
+    def encode_action(self, action):
+        return self.action_space.index(action)
+
+    def decode_action(self, code):
+        return self.action_space[code]
+
+    def encoded_start_state(self):
+        state = self.start_state() if callable(self.start_state) else self.start_state
+        return self.encode_state(state)
+
+    def respond_to_action_encoded(self, action):
+        """
+        action: a tuple of action codes, one per agent (one code for a single-agent environment).
+        Returns reward, new_state_code
+        """
+        if(self.num_agents == 1):
+            reward, new_state = self.respond_to_action(self.action_space[action])
+        else:
+            reward, new_state = self.respond_to_action(tuple(self.action_space[a] for a in action))
+        return reward, self.encode_state(new_state)
+
+    def is_terminal_encoded(self, code):
+        return self.isTerminalState(self.decode_state(code))
+
+    def describe(self):
+        """
+        Returns a dict describing the environment's configuration.
+        """
+        config = {"class": type(self).__name__}
+        for name in ("n", "rewards", "terminal_states", "stochastic", "start_state"):
+            value = getattr(self, name, None)
+            if value is not None and not callable(value):
+                config[name] = value
+        return config
+
+    # Compilation
+    def enumerate_outcomes(self, state, action):
+        """
+        Returns new_state, rewards for taking action in state, where rewards is a tuple
+        of equally likely rewards. Only tabular environments with deterministic
+        transitions implement this.
+        """
+        raise NotImplementedError("{} cannot be enumerated".format(type(self).__name__))
+
+    def compile(self, cache_path=None):
+        """
+        Enumerates the environment into transition/reward tables and returns a
+        CompiledEnvironment stepping on them.
+        cache_path: optional .npz file the tables are loaded from, or saved to when missing
+        or built for a different configuration.
+        """
+        from compiled import CompiledEnvironment, build_tables, environment_key, load_tables, save_tables
+
+        tables = None
+        if cache_path is not None:
+            key = environment_key(self)
+            tables = load_tables(cache_path, key)
+        if tables is None:
+            tables = build_tables(self)
+            if cache_path is not None:
+                save_tables(cache_path, key, tables)
+        return CompiledEnvironment(self, tables)
+
 
 class ClimbingGame(Environment):
     def __init__(self, part_stochastic=False, full_stochastic=False):
@@ -72,6 +163,10 @@ class ClimbingGame(Environment):
 
         return reward, self.get_new_state(action)
 
+    def enumerate_outcomes(self, state, action):
+        rewards = self.rewards[action]
+        return self.get_new_state(action, state), rewards if self.stochastic else (rewards,)
+
     # Returns the new state (x, y) for a given action.
     def get_new_state(self, action, state=None):
 
@@ -105,6 +200,9 @@ class PenaltyGame(Environment):
 
         return reward, self.get_new_state(action)
 
+    def enumerate_outcomes(self, state, action):
+        return self.get_new_state(action, state), (self.rewards[action],)
+
     # Returns the new state (x, y) for a given action.
     def get_new_state(self, action, state=None):
 
@@ -150,6 +248,11 @@ class Boutilier(Environment):
 
         return reward, new_state
 
+    def enumerate_outcomes(self, state, action):
+        new_state = self.get_new_state(action, state)
+        rewards = self.rewards[new_state]
+        return new_state, rewards if self.stochastic else (rewards,)
+
     def get_new_state(self, action, state=None):
 
         if state is None:
@@ -192,6 +295,58 @@ def bound_coordinate(x):
     #     return x
 
 
+def encode_relative_state(state):
+    """
+    Maps ((x1, y1), (x2, y2)) with coordinates in [-4, 5] to its index in the
+    predator state space (the order the nested loops in Predator build it).
+    """
+    (x1, y1), (x2, y2) = state
+    return (((x1 + 4) * 10 + y1 + 4) * 10 + x2 + 4) * 10 + y2 + 4
+
+
+def decode_relative_state(code):
+    code, y2 = divmod(code, 10)
+    code, x2 = divmod(code, 10)
+    x1, y1 = divmod(code, 10)
+    return ((x1 - 4, y1 - 4), (x2 - 4, y2 - 4))
+
+
+class RelativeStateSpace(Sequence):
+    """
+    The 10,000 predator states ((x1, y1), (x2, y2)) with coordinates in [-4, 5], in the order
+    of encode_relative_state. States are generated on demand instead of stored in a list.
+    """
+
+    def __len__(self):
+        return 10000
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(10000))]
+        if index < 0:
+            index += 10000
+        if not 0 <= index < 10000:
+            raise IndexError("state index out of range")
+        return decode_relative_state(index)
+
+    def __iter__(self):
+        coordinates = [(x, y) for x in range(-4, 6) for y in range(-4, 6)]
+        for pos1 in coordinates:
+            for pos2 in coordinates:
+                yield (pos1, pos2)
+
+    def __contains__(self, state):
+        try:
+            return all(-4 <= c <= 5 for pos in state for c in pos) and len(state) == 2
+        except TypeError:
+            return False
+
+    def index(self, state):
+        if state not in self:
+            raise ValueError("{} is not in the state space".format(state))
+        return encode_relative_state(state)
+
+
 def random_pos():
     while(1):
         agent1 = (randrange(-4, 6), randrange(-4, 6))
@@ -209,13 +364,8 @@ def random_pos():
 class Predator(Environment):
     def __init__(self):
         # Set up state space
-        # Every possible coordinate combination
-        state_space = []
-        for x1 in range(-4, 6):
-            for y1 in range(-4, 6):
-                for x2 in range(-4, 6):
-                    for y2 in range(-4, 6):
-                        state_space.append(((x1, y1), (x2, y2)))
+        # Every possible coordinate combination, generated on demand
+        state_space = RelativeStateSpace()
 
         # Give each predator a unique starting space
         self.agent1_pos, self.agent2_pos = random_pos()
@@ -228,6 +378,12 @@ class Predator(Environment):
     def resetCaptues(self):
         self.captureCount = 0
 
+    def encode_state(self, state):
+        return encode_relative_state(state)
+
+    def decode_state(self, code):
+        return decode_relative_state(code)
+
     def isTerminalState(self, state):
         pos1 = state[0]
         pos2 = state[1]
@@ -324,6 +480,10 @@ class Predator(Environment):
         return reward, (p1_state, p2_state)
 
 
+# (dx, dy) for each action code of Predator2: left, right, up, down, stay
+PREDATOR2_MOVES = [(-1, 0), (1, 0), (0, -1), (0, 1), (0, 0)]
+
+
 def make_grid_space(n):
     arr = []
     for i in range(n):
@@ -334,7 +494,7 @@ def make_grid_space(n):
 
 class Predator2(Environment):
     def __init__(self, n = 10):
-        state_space = []
+        state_space = RelativeStateSpace()
         import math
         up_bound = math.floor(n/2)
         low_bound = math.floor(n/2) * 1
@@ -342,11 +502,6 @@ class Predator2(Environment):
             up_bound += 1
             low_bound += 1
         
-        for x1 in range(-4, 6):
-            for y1 in range(-4, 6):
-                for x2 in range(-4, 6):
-                    for y2 in range(-4, 6):
-                        state_space.append(((x1, y1), (x2, y2)))
         self.agent1_pos, self.agent2_pos = random_pos()
         self.supportStates = [(1, 0), (-1, 0), (0, 1), (0, -1)]
         self.captureCount = 0
@@ -374,6 +529,16 @@ class Predator2(Environment):
     def get_new_true_state(self):
         return [self.true_space[i] for i in sample(range(100), 3)]
     
+    def encode_state(self, state):
+        return encode_relative_state(state)
+
+    def decode_state(self, code):
+        return decode_relative_state(code)
+
+    def update_ind_state_encoded(self, state, action):
+        dx, dy = PREDATOR2_MOVES[action]
+        return ((state[0] + dx) % 10, (state[1] + dy) % 10)
+
     def update_ind_state(self, state, action):
         if(action == 'left'):
             return ((state[0]-1)%10, state[1])
@@ -445,13 +610,20 @@ class Predator2(Environment):
         print(grid)
     
     def respond_to_action(self, action):
+        return self._respond(action, self.update_ind_state, self.action_space, ['left', 'right', 'up', 'down'])
+
+    def respond_to_action_encoded(self, action):
+        reward, state = self._respond(action, self.update_ind_state_encoded, range(5), range(4))
+        return reward, encode_relative_state(state)
+
+    def _respond(self, action, update_ind_state, actions, mouse_actions):
         true_pred_state  = [self.current_true_state[1], self.current_true_state[2]]
         mouse_true_state = self.current_true_state[0]
         
         if (random() >= 0.2): # predator game is stochastic 
-            new_pred_state = [self.update_ind_state(state, action[i]) for i, state in enumerate(true_pred_state)]
+            new_pred_state = [update_ind_state(state, action[i]) for i, state in enumerate(true_pred_state)]
         else:
-            new_pred_state = [self.update_ind_state(state, choice(self.action_space)) for i, state in enumerate(true_pred_state)]
+            new_pred_state = [update_ind_state(state, choice(actions)) for i, state in enumerate(true_pred_state)]
         
         rel_states = self.process_states(mouse_true_state, *new_pred_state)
         
@@ -476,8 +648,8 @@ class Predator2(Environment):
         # mouse moves after predators move
         if(random() >= 0.2):
             possible_new_states = []
-            for action in ['left', 'right', 'up', 'down']:
-                new_state = self.update_ind_state(mouse_true_state, action)
+            for action in mouse_actions:
+                new_state = update_ind_state(mouse_true_state, action)
                 if(new_state not in new_pred_state):
                     possible_new_states.append(new_state)
             new_mouse_state = choice(possible_new_states)
@@ -489,92 +661,131 @@ class Predator2(Environment):
         
         return 0, (rel_states[1], rel_states[2])
     
-class GridWorld(Environment):
-    def __init__(self, n, start_state, terminal_states):
-        """
-        Initializes a GridWorld environment, whose search space is a list of tuples from the range (0, n-1) to... (n-1, n-1) and whose
-        action space is the list ["left", "right", "up", "down"].
-        start_state: a tuple in the search_space that is the start_state for the agent.
-        terminal_states: a list of tuples in the search space that represent the terminal states for the environment.
-        """
-        search_space = []
-        for i in range(n * n):
-            x = i // n
-            y = i % n
-            search_space.append((x, y))
-        Environment.__init__(self, search_space, [
-            'left', 'right', 'up', 'down'], start_state)
-        self.terminal_states = terminal_states
-        self.n = n
+# (dx, dy) for each action code of GridWorld: left, right, up, down
+GRID_WORLD_MOVES = [(-1, 0), (1, 0), (0, -1), (0, 1)]
 
-    def respond_to_action(self, action):
-        """
-        Updates the current the state for a given action.
-        Returns reward, new_state
-        """
-        self.previous_state = self.current_state
-        new_state = self.get_new_state(action)
-        if(new_state in self.terminal_states):
-            reward = 1
-        else:
-            reward = -1
-        self.current_state = new_state
-        return reward, new_state
 
-    def get_new_state(self, action, state=None):
-        """
-        Returns the new state (x, y) for a given action.
-        """
-        if(state == None):
-            x, y = self.get_state()
-        else:
-            x, y = state
-        if(action == 'left'):
-            x -= 1
-        elif(action == 'right'):
-            x += 1
-        elif(action == 'up'):
-            y -= 1
-        elif(action == 'down'):
-            y += 1
-        else:
-            raise ValueError("ERROR Unknown action: {}".format(action))
+class GridStateSpace(Sequence):
+    """
+    The n*n GridWorld states (x, y), in the order of GridWorld.encode_state (x * n + y).
+    States are generated on demand instead of stored in a list.
+    """
 
-        n = self.n
+    def __init__(self, n):
+        self.n = n
 
-        if(x < 0):
-            x = 0
-        elif(x >= n):
-            x = n - 1
+    def __len__(self):
+        return self.n * self.n
 
-        if(y < 0):
-            y = 0
-        elif(y >= n):
-            y = n - 1
+    def __getitem__(self, index):
+        size = self.n * self.n
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(size))]
+        if index < 0:
+            index += size
+        if not 0 <= index < size:
+            raise IndexError("state index out of range")
+        return divmod(index, self.n)
 
-        return (x, y)
+    def __iter__(self):
+        n = self.n
+        for x in range(n):
+            for y in range(n):
+                yield (x, y)
 
-    def isTerminalState(self, state):
-        return state in self.terminal_states
+    def __contains__(self, state):
+        try:
+            x, y = state
+            return 0 <= x < self.n and 0 <= y < self.n
+        except (TypeError, ValueError):
+            return False
+
+    def index(self, state):
+        if state not in self:
+            raise ValueError("{} is not in the state space".format(state))
+        return state[0] * self.n + state[1]
 
 
 class GridWorld(Environment):
-    def __init__(self, n, start_state, terminal_states):
+    num_agents = 1
+
+    def __init__(self, n, start_state, terminal_states, obstacles=None, reward_map=None):
         """
-        Initializes a GridWorld environment, whose state space is a list of tuples from the range (0, n-1) to... (n-1, n-1) and whose
+        Initializes a GridWorld environment, whose state space is the tuples from (0, 0) to (n-1, n-1) and whose
         action space is the list ["left", "right", "up", "down"].
         start_state: a tuple in the state_space that is the start_state for the agent.
         terminal_states: a list of tuples in the state space that represent the terminal states for the environment.
+        obstacles: optional cells the agent cannot enter (moving into one leaves it in place), as an
+        (n, n) boolean array or a list of tuples.
+        reward_map: optional (n, n) array of the reward for entering each cell. By default entering a
+        terminal state gives 1 and any other cell -1.
+
+        States are indexed arithmetically (see GridStateSpace) and terminal states are looked up in a
+        set, so neither costs more on a large grid; see grid_kernel.py for many episodes at once.
         """
-        state_space = []
-        for i in range(n * n):
-            x = i // n
-            y = i % n
-            state_space.append((x, y))
-        Environment.__init__(self, state_space, [
+        Environment.__init__(self, GridStateSpace(n), [
             'left', 'right', 'up', 'down'], start_state)
         self.terminal_states = terminal_states
         self.n = n
+        self._terminal_set = {tuple(state) for state in terminal_states}
+        self._terminal_codes = {x * n + y for x, y in self._terminal_set}
+        self.obstacles = None
+        self.reward_map = None
+        if(obstacles is not None or reward_map is not None):
+            import numpy as np
+            if(obstacles is not None):
+                if(not isinstance(obstacles, np.ndarray)):
+                    cells = obstacles
+                    obstacles = np.zeros((n, n), dtype=bool)
+                    for x, y in cells:
+                        obstacles[x, y] = True
+                self.obstacles = np.asarray(obstacles, dtype=bool)
+            if(reward_map is not None):
+                self.reward_map = np.asarray(reward_map, dtype=float)
+
+    def describe(self):
+        config = Environment.describe(self)
+        import hashlib
+        for name in ("obstacles", "reward_map"):
+            array = getattr(self, name)
+            if array is not None:
+                config[name] = hashlib.sha1(array.tobytes()).hexdigest()
+        return config
+
+    def encode_state(self, state):
+        return state[0] * self.n + state[1]
+
+    def decode_state(self, code):
+        return divmod(code, self.n)
+
+    def is_terminal_encoded(self, code):
+        return code in self._terminal_codes
+
+    def reward_for(self, x, y):
+        """
+        The reward for entering cell (x, y).
+        """
+        if(self.reward_map is not None):
+            return self.reward_map[x, y].item()
+        return 1 if (x, y) in self._terminal_set else -1
+
+    def respond_to_action_encoded(self, action):
+        """
+        action: the action code of the single agent (or a one-element tuple).
+        Returns reward, new_state_code
+        """
+        if isinstance(action, tuple):
+            action = action[0]
+        n = self.n
+        x, y = self.current_state
+        dx, dy = GRID_WORLD_MOVES[action]
+        new_x = min(max(x + dx, 0), n - 1)
+        new_y = min(max(y + dy, 0), n - 1)
+        if(self.obstacles is not None and self.obstacles[new_x, new_y]):
+            new_x, new_y = x, y
+        self.previous_state = self.current_state
+        self.current_state = (new_x, new_y)
+        return self.reward_for(new_x, new_y), new_x * n + new_y
 
     def respond_to_action(self, action):
         """
@@ -583,12 +794,20 @@ class GridWorld(Environment):
         """
         self.previous_state = self.current_state
         new_state = self.get_new_state(action)
-        if(new_state in self.terminal_states):
-            reward = 1
-        else:
-            reward = -1
         self.current_state = new_state
-        return reward, new_state
+        return self.reward_for(*new_state), new_state
+
+    def enumerate_outcomes(self, state, action):
+        new_state = self.get_new_state(action, state)
+        return new_state, (self.reward_for(*new_state),)
+
+    def transition_tables(self):
+        """
+        The tables of compiled.build_tables, built with array operations instead of a search
+        over the states.
+        """
+        from grid_kernel import grid_tables
+        return grid_tables(self)
 
     def get_new_state(self, action, state=None):
         """
@@ -598,6 +817,7 @@ class GridWorld(Environment):
             x, y = self.get_state()
         else:
             x, y = state
+        old_x, old_y = x, y
         if(action == 'left'):
             x -= 1
         elif(action == 'right'):
@@ -621,7 +841,10 @@ class GridWorld(Environment):
         elif(y >= n):
             y = n - 1
 
+        if(self.obstacles is not None and self.obstacles[x, y]):
+            return (old_x, old_y)
+
         return (x, y)
 
     def isTerminalState(self, state):
-        return state in self.terminal_states
+        return state in self._terminal_set
@@ -0,0 +1,297 @@
+"""
+Runs an experiment described by a JSON spec, without a notebook:
+
+    python experiment.py experiments/climbing_game.json -o climbing.npz --workers 4
+
+A spec holds
+    environment: {"class": a class of environment.py, "args": its keyword arguments};
+    agents: a list of agent specs, each with
+        class: QLearner, HystereticQLearner, RandomAgent or FixedAgent;
+        learning_rate, decrease_rate, discount_rate, exploration_rate: rates (see below);
+        policy: "epsilon_greedy" (the default, with exploration_rate) or "boltzmann";
+        choice: FixedAgent's action;
+        options: other keyword arguments of the learner (dense, encoded, lazy, initial_value);
+        count: how many copies of the agent (default 1);
+    temperature: the system temperature, a rate; numbers decay by 0.99 per step;
+    trials, timesteps, seed;
+    variants (optional): name -> spec entries to override, e.g. one variant per
+        ClimbingGame reward setting; every variant is run and saved.
+A rate is a number or a schedule of schedules.py, {"schedule": "Exponential", "args": [...]}
+("Piecewise" takes [[start, rate], ...]).
+
+backend "batch" runs the trials in lockstep with batch.simulate_batch, in chunks of
+chunk_size trials spread over the workers; it needs two identical QLearner or
+HystereticQLearner agents with epsilon-greedy or Boltzmann selection on a compilable
+two-player environment. backend "simulate" runs SimulationTrial over runner.py's process
+pool and handles everything else. "auto" (the default) picks batch when it can. Both evaluate
+the rates at the trial's step t, counted across episodes, and give the reward matrix the
+notebooks plot: [i, t] is the reward of the episode of trial i that ended at step t.
+
+With --cache DIR, finished trials (or batch chunks) are kept in a result_store.ResultStore
+and rerunning a spec only runs those whose environment, agents, temperature, timesteps, seed
+or code changed.
+
+Results are written with np.savez_compressed, one column per array: for every variant
+"<variant>/rewards" (trials, timesteps), "<variant>/mean" and "<variant>/median" (timesteps,),
+and "spec", the JSON of the spec that ran.
+"""
+import argparse
+import copy
+import json
+import sys
+import time
+
+import numpy as np
+
+from runner import SimulationTrial, run_jobs, run_trials, trial_seeds
+
+LEARNERS = ("QLearner", "HystereticQLearner")
+CHUNK_SIZE = 100
+
+
+def build_rate(rate):
+    """
+    A number, or the schedule a {"schedule": name, "args": [...], "kwargs": {...}} dict describes.
+    """
+    if not isinstance(rate, dict):
+        return rate
+    import schedules
+
+    name = rate["schedule"]
+    args = rate.get("args", [])
+    if name == "Piecewise":
+        args = [[(start, build_rate(piece)) for start, piece in args[0]]]
+    return getattr(schedules, name)(*args, **rate.get("kwargs", {}))
+
+
+def _callable_rate(rate):
+    # the learners call their rates; numbers become constant schedules
+    from schedules import Constant
+
+    rate = build_rate(rate)
+    return rate if callable(rate) else Constant(rate)
+
+
+def build_environment(spec):
+    import environment
+
+    environment_spec = spec["environment"]
+    return getattr(environment, environment_spec["class"])(**environment_spec.get("args", {}))
+
+
+def expand_agents(spec):
+    agents = []
+    for agent_spec in spec["agents"]:
+        agents.extend([agent_spec] * agent_spec.get("count", 1))
+    return agents
+
+
+def build_agent(agent_spec, task):
+    import agent
+    from HystereticQLearner import HystereticQLearner
+
+    name = agent_spec["class"]
+    if name == "RandomAgent":
+        return agent.RandomAgent(task)
+    if name == "FixedAgent":
+        return agent.FixedAgent(task, agent_spec["choice"])
+    if name not in LEARNERS:
+        raise ValueError("Unknown agent class {}".format(name))
+
+    exploration_rate = build_rate(agent_spec.get("exploration_rate", 0.1))
+    if agent_spec.get("policy", "epsilon_greedy") == "boltzmann":
+        import boltzmann
+        policy = boltzmann.selection
+    else:
+        from policy import epsilon_greedy
+        policy = epsilon_greedy(exploration_rate)
+    rates = [_callable_rate(agent_spec.get("learning_rate", 0.1)), _callable_rate(agent_spec.get("discount_rate", 0.9))]
+    options = agent_spec.get("options", {})
+    if name == "HystereticQLearner":
+        return HystereticQLearner(task, exploration_rate, *rates, _callable_rate(agent_spec.get("decrease_rate", 0.01)),
+                                  policy, **options)
+    return agent.QLearner(task, exploration_rate, *rates, policy, **options)
+
+
+class MakeTask:
+    def __init__(self, spec):
+        self.spec = spec
+
+    def __call__(self):
+        return build_environment(self.spec)
+
+    def describe(self):
+        return {"environment": self.spec["environment"]}
+
+
+class MakeAgents:
+    def __init__(self, spec):
+        self.spec = spec
+
+    def __call__(self, task):
+        return [build_agent(agent_spec, task) for agent_spec in expand_agents(self.spec)]
+
+    def describe(self):
+        return {"agents": self.spec["agents"]}
+
+
+def batch_unsupported(spec):
+    """
+    Why spec cannot run on the batch backend, or None if it can.
+    """
+    from environment import Environment
+
+    agents = expand_agents(spec)
+    if len(agents) != 2 or agents[0] != agents[1]:
+        return "it needs two identical agents"
+    agent_spec = agents[0]
+    if agent_spec["class"] not in LEARNERS:
+        return "{} is not a learner".format(agent_spec["class"])
+    if agent_spec.get("options", {}).get("initial_value", 0) != 0:
+        return "its Q-values start at 0"
+    policy = agent_spec.get("policy", "epsilon_greedy")
+    if policy == "boltzmann" and spec.get("temperature") is None:
+        return "Boltzmann selection needs a temperature"
+    task = build_environment(spec)
+    if task.num_agents != 2 or type(task).enumerate_outcomes is Environment.enumerate_outcomes:
+        return "{} is not a compilable two-player environment".format(type(task).__name__)
+    return None
+
+
+class BatchChunk:
+    """
+    simulate_batch over num_trials trials of spec; a trial for runner.run_jobs.
+    """
+
+    def __init__(self, spec, num_trials):
+        self.spec = spec
+        self.num_trials = num_trials
+
+    def describe(self):
+        spec = self.spec
+        return {"trial": "BatchChunk", "environment": spec["environment"], "agents": spec["agents"],
+                "temperature": spec.get("temperature"), "timesteps": spec["timesteps"], "num_trials": self.num_trials}
+
+    def __call__(self, seed):
+        from batch import simulate_batch
+
+        spec = self.spec
+        agent_spec = spec["agents"][0]
+        boltzmann = agent_spec.get("policy", "epsilon_greedy") == "boltzmann"
+        decrease_rate = agent_spec.get("decrease_rate", 0.01) if agent_spec["class"] == "HystereticQLearner" else None
+        return simulate_batch(
+            build_environment(spec).compile(), self.num_trials, spec["timesteps"],
+            build_rate(agent_spec.get("learning_rate", 0.1)), build_rate(decrease_rate),
+            build_rate(agent_spec.get("discount_rate", 0.9)),
+            system_temperature=build_rate(spec["temperature"]) if boltzmann else None,
+            exploration_rate=None if boltzmann else build_rate(agent_spec.get("exploration_rate", 0.1)),
+            seed=seed)
+
+
+def run_spec(spec, backend="auto", workers=None, store=None):
+    """
+    Runs one (variant-free) spec and returns (rewards, backend used). store: a
+    result_store.ResultStore.
+    """
+    trials = spec["trials"]
+    timesteps = spec["timesteps"]
+    seed = spec.get("seed")
+    if backend in ("auto", "batch"):
+        reason = batch_unsupported(spec)
+        if reason is None:
+            backend = "batch"
+        elif backend == "batch":
+            raise ValueError("The batch backend cannot run this spec: {}".format(reason))
+        else:
+            backend = "simulate"
+
+    if backend == "batch":
+        chunk_size = spec.get("chunk_size", CHUNK_SIZE)
+        sizes = [min(chunk_size, trials - start) for start in range(0, trials, chunk_size)]
+        jobs = [(BatchChunk(spec, size), chunk_seed) for size, chunk_seed in zip(sizes, trial_seeds(seed, len(sizes)))]
+        return np.concatenate(run_jobs(jobs, workers, store)), backend
+
+    temperature = build_rate(spec.get("temperature"))
+    trial = SimulationTrial(MakeTask(spec), MakeAgents(spec), timesteps, temperature)
+    return run_trials(trial, trials, seed, workers, store), backend
+
+
+def _merge(base, overrides):
+    merged = copy.deepcopy(base)
+    for key, value in overrides.items():
+        if isinstance(value, dict) and isinstance(merged.get(key), dict):
+            merged[key] = _merge(merged[key], value)
+        else:
+            merged[key] = value
+    return merged
+
+
+def variants(spec):
+    """
+    name -> spec of every variant of spec (just {"default": spec} without variants).
+    """
+    base = {key: value for key, value in spec.items() if key != "variants"}
+    if "variants" not in spec:
+        return {"default": base}
+    return {name: _merge(base, overrides) for name, overrides in spec["variants"].items()}
+
+
+def run_experiment(spec, output=None, backend=None, workers=None, log=None, store=None):
+    """
+    Runs every variant of spec and returns {"<variant>/rewards": ..., ...}; saves it to the
+    .npz file output when given.
+    """
+    columns = {"spec": np.array(json.dumps(spec, sort_keys=True))}
+    for name, variant in variants(spec).items():
+        start = time.perf_counter()
+        rewards, used = run_spec(variant, backend or variant.get("backend", "auto"), workers, store)
+        columns[name + "/rewards"] = rewards
+        columns[name + "/mean"] = rewards.mean(axis=0)
+        columns[name + "/median"] = np.median(rewards, axis=0)
+        if log is not None:
+            tail = rewards[:, -max(1, rewards.shape[1] // 10):]
+            log("{}: {} trials x {} steps on {} in {:.1f}s, final mean reward {:.3f}".format(
+                name, rewards.shape[0], rewards.shape[1], used, time.perf_counter() - start, tail.mean()))
+    if output is not None:
+        np.savez_compressed(output, **columns)
+    return columns
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python experiment.py", description="Run an experiment spec.")
+    parser.add_argument("spec", help="the JSON spec file")
+    parser.add_argument("-o", "--output", help="the .npz file to write (default: the spec's name)")
+    parser.add_argument("--workers", type=int, help="number of processes (default: the CPU count)")
+    parser.add_argument("--backend", choices=("auto", "batch", "simulate"), help="overrides the spec's backend")
+    parser.add_argument("--trials", type=int, help="overrides the spec's trials")
+    parser.add_argument("--timesteps", type=int, help="overrides the spec's timesteps")
+    parser.add_argument("--seed", type=int, help="overrides the spec's seed")
+    parser.add_argument("--cache", help="a result store directory; cached trials are not rerun")
+    parser.add_argument("--cache-size", type=float, default=1024, help="the result store's size limit in MiB")
+    args = parser.parse_args(argv)
+
+    with open(args.spec) as f:
+        spec = json.load(f)
+    for name in ("trials", "timesteps", "seed"):
+        if getattr(args, name) is not None:
+            spec[name] = getattr(args, name)
+    output = args.output or spec.get("name", "experiment") + ".npz"
+
+    def log(message):
+        print(message, file=sys.stderr)
+
+    store = None
+    if args.cache:
+        from result_store import ResultStore
+        store = ResultStore(args.cache, int(args.cache_size * 2 ** 20))
+    try:
+        run_experiment(spec, output, args.backend, args.workers, log, store)
+    except ValueError as error:
+        parser.error(str(error))
+    if store is not None:
+        log("result store: {} trials reused, {} run".format(store.hits, store.misses))
+    log("wrote {}".format(output))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+"""
+Vectorized GridWorld dynamics: steps many independent GridWorld episodes at once on arrays of
+state codes, and builds a GridWorld's transition tables without visiting its states one by
+one.
+
+A step follows GridWorld.respond_to_action: the walker moves one cell, stays on the grid,
+cannot enter an obstacle, and receives the reward for the cell it enters (by default 1 for a
+terminal state and -1 elsewhere). Terminal episodes restart from the start state, as
+simulate_task does.
+
+The grid is held as flat (n * n,) arrays indexed by state code (x * n + y): a terminal
+bitmap, an obstacle bitmap and the rewards, so a step is a few array operations whatever the
+grid size or the number of terminal states.
+
+States are reported as GridWorld state codes, actions as GridWorld action codes (see
+GRID_WORLD_MOVES).
+"""
+import numpy as np
+
+from environment import GRID_WORLD_MOVES
+
+MOVES = np.array(GRID_WORLD_MOVES)
+
+
+class GridArrays:
+    """
+    The flat arrays of a GridWorld: terminal and obstacles (bool) and rewards (float) for
+    entering each cell.
+    """
+
+    def __init__(self, world):
+        n = world.n
+        self.n = n
+        self.terminal = np.zeros(n * n, dtype=bool)
+        if world._terminal_codes:
+            self.terminal[np.fromiter(world._terminal_codes, dtype=np.intp)] = True
+        if world.obstacles is not None:
+            self.obstacles = world.obstacles.reshape(-1)
+        else:
+            self.obstacles = None
+        if world.reward_map is not None:
+            self.rewards = world.reward_map.reshape(-1)
+        else:
+            self.rewards = np.where(self.terminal, 1.0, -1.0)
+
+    def next_codes(self, codes, actions):
+        """
+        The codes reached from codes (any shape) by actions (broadcastable to it).
+        """
+        n = self.n
+        x, y = np.divmod(codes, n)
+        moves = MOVES[actions]
+        new_x = np.clip(x + moves[..., 0], 0, n - 1)
+        new_y = np.clip(y + moves[..., 1], 0, n - 1)
+        new_codes = new_x * n + new_y
+        if self.obstacles is not None:
+            new_codes = np.where(self.obstacles[new_codes], codes, new_codes)
+        return new_codes
+
+
+def grid_tables(world):
+    """
+    world's tables in the format of compiled.build_tables, built for every state at once.
+    Terminal states and obstacles, which are never left, keep self-loops with reward 0.
+    """
+    arrays = GridArrays(world)
+    num_states = world.n * world.n
+    codes = np.arange(num_states)
+    next_states = arrays.next_codes(codes[:, None], np.arange(len(GRID_WORLD_MOVES))[None, :])
+    reward_values = arrays.rewards[next_states][..., None]
+    dead = arrays.terminal.copy()
+    if arrays.obstacles is not None:
+        dead |= arrays.obstacles
+    next_states[dead] = codes[dead, None]
+    reward_values[dead] = 0.0
+    start = world.start_state() if callable(world.start_state) else world.start_state
+    return {
+        "next_states": next_states,
+        "reward_values": reward_values,
+        "reward_counts": np.ones(next_states.shape, dtype=np.intp),
+        "terminal": arrays.terminal,
+        "start": np.array(world.encode_state(start)),
+    }
+
+
+class GridWorldBatch:
+    """
+    num_episodes walkers on world, each in its own episode.
+    steps: the number of steps of each walker's current episode.
+    completed: the number of episodes each walker has finished.
+    """
+
+    def __init__(self, world, num_episodes):
+        self.world = world
+        self.num_episodes = num_episodes
+        self.arrays = GridArrays(world)
+        start = world.start_state() if callable(world.start_state) else world.start_state
+        self.start_code = world.encode_state(start)
+        self.codes = np.full(num_episodes, self.start_code, dtype=np.intp)
+        self.steps = np.zeros(num_episodes, dtype=np.intp)
+        self.completed = np.zeros(num_episodes, dtype=np.intp)
+
+    def reset(self, mask=None):
+        """
+        Puts the masked walkers (all by default) back on the start state.
+        """
+        if mask is None:
+            mask = np.ones(self.num_episodes, dtype=bool)
+        self.codes[mask] = self.start_code
+        self.steps[mask] = 0
+
+    def get_states(self):
+        return self.codes.copy()
+
+    def step(self, actions):
+        """
+        actions: (num_episodes,) action codes.
+        Returns rewards, new state codes and terminal flags, each of shape (num_episodes,).
+        """
+        arrays = self.arrays
+        new_codes = arrays.next_codes(self.codes, np.asarray(actions))
+        rewards = arrays.rewards[new_codes]
+        terminal = arrays.terminal[new_codes]
+        self.completed += terminal
+        # terminal episodes restart; new_codes still reports the terminal states reached
+        self.codes = np.where(terminal, self.start_code, new_codes)
+        self.steps += 1
+        self.steps[terminal] = 0
+        return rewards, new_codes, terminal
@@ -0,0 +1,376 @@
+"""
+Per-step metrics recorders for simulate_task.
+
+simulate_task(..., metrics=recorder) calls recorder.record(t, reward, actions, temperature,
+td_errors, done) after every step:
+    t: the timestep of the step;
+    reward: the reward the joint action received;
+    actions: the joint action as a tuple of action codes, one per agent (see Environment.encode_action);
+    temperature: the system temperature the actions were chosen with (None without Boltzmann selection);
+    td_errors: each agent's TD error for the step (see TDLearner.td_error), NaN for agents that don't learn;
+    done: whether the step ended the episode.
+
+Recorders hold a bounded amount of memory, whatever the number of steps:
+    RingBuffer keeps the last capacity steps in RAM;
+    ChunkedWriter streams every step to memory-mapped .npy files on disk, one file per column and chunk;
+    StreamingStats keeps running aggregates (mean, variance, median) of the reward and TD error;
+    PerStepAggregate keeps the mean and median over trials of the reward at each timestep, which is
+    what the notebooks plot, without the (num_trials, timesteps) matrix.
+Use Tee to send the same steps to several recorders.
+"""
+import os
+
+import numpy as np
+
+
+class Recorder:
+    def record(self, t, reward, actions, temperature, td_errors, done):
+        pass
+
+    def end_trial(self):
+        """
+        Called once a trial (a run of simulate_task calls over the whole horizon) is over.
+        """
+        pass
+
+    def close(self):
+        pass
+
+
+class Tee(Recorder):
+    def __init__(self, *recorders):
+        self.recorders = recorders
+
+    def record(self, t, reward, actions, temperature, td_errors, done):
+        for recorder in self.recorders:
+            recorder.record(t, reward, actions, temperature, td_errors, done)
+
+    def end_trial(self):
+        for recorder in self.recorders:
+            recorder.end_trial()
+
+    def close(self):
+        for recorder in self.recorders:
+            recorder.close()
+
+
+def _columns(num_agents):
+    return {
+        "t": ((), np.int64),
+        "reward": ((), np.float64),
+        "actions": ((num_agents,), np.int32),
+        "temperature": ((), np.float64),
+        "td_error": ((num_agents,), np.float64),
+        "done": ((), np.bool_),
+    }
+
+
+def _temperature(temperature):
+    return np.nan if temperature is None else temperature
+
+
+class RingBuffer(Recorder):
+    """
+    Keeps the last capacity steps in fixed-size arrays.
+    """
+
+    def __init__(self, capacity, num_agents=2):
+        self.capacity = capacity
+        self.columns = {name: np.zeros((capacity,) + shape, dtype=dtype)
+                        for name, (shape, dtype) in _columns(num_agents).items()}
+        self.count = 0
+
+    def record(self, t, reward, actions, temperature, td_errors, done):
+        i = self.count % self.capacity
+        columns = self.columns
+        columns["t"][i] = t
+        columns["reward"][i] = reward
+        columns["actions"][i] = actions
+        columns["temperature"][i] = _temperature(temperature)
+        columns["td_error"][i] = td_errors
+        columns["done"][i] = done
+        self.count += 1
+
+    def __len__(self):
+        return min(self.count, self.capacity)
+
+    def to_arrays(self):
+        """
+        Returns a dict of column name -> array of the buffered steps, oldest first.
+        """
+        if self.count <= self.capacity:
+            return {name: column[:self.count].copy() for name, column in self.columns.items()}
+        start = self.count % self.capacity
+        return {name: np.roll(column, -start, axis=0) for name, column in self.columns.items()}
+
+
+class ChunkedWriter(Recorder):
+    """
+    Streams every step to directory as one memory-mapped .npy file per column and chunk of
+    chunk_size steps, named <column>.<chunk number>.npy. Only the current chunk is mapped, so
+    memory stays bounded however long the run; read the columns back with load_chunks.
+    """
+
+    def __init__(self, directory, num_agents=2, chunk_size=1 << 16):
+        self.directory = directory
+        self.chunk_size = chunk_size
+        self.layout = _columns(num_agents)
+        self.chunk = -1
+        self.position = chunk_size
+        self.columns = None
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, name, chunk):
+        return os.path.join(self.directory, "{}.{:06d}.npy".format(name, chunk))
+
+    def _next_chunk(self):
+        self.flush()
+        self.chunk += 1
+        self.position = 0
+        self.columns = {name: np.lib.format.open_memmap(self._path(name, self.chunk), mode="w+", dtype=dtype,
+                                                        shape=(self.chunk_size,) + shape)
+                        for name, (shape, dtype) in self.layout.items()}
+
+    def record(self, t, reward, actions, temperature, td_errors, done):
+        if self.position == self.chunk_size:
+            self._next_chunk()
+        i = self.position
+        columns = self.columns
+        columns["t"][i] = t
+        columns["reward"][i] = reward
+        columns["actions"][i] = actions
+        columns["temperature"][i] = _temperature(temperature)
+        columns["td_error"][i] = td_errors
+        columns["done"][i] = done
+        self.position += 1
+
+    def flush(self):
+        if self.columns is not None:
+            for column in self.columns.values():
+                column.flush()
+
+    def close(self):
+        if self.columns is None:
+            return
+        self.flush()
+        columns, self.columns = self.columns, None
+        if self.position < self.chunk_size:
+            # shrink the last chunk to the steps actually written; the memmaps are dropped
+            # (unmapping their files) before the files are rewritten
+            used = {name: np.array(column[:self.position]) for name, column in columns.items()}
+            del columns
+            for name, array in used.items():
+                np.save(self._path(name, self.chunk), array)
+
+
+def load_chunks(directory, mmap_mode="r"):
+    """
+    Returns a dict of column name -> list of the chunk arrays written by a ChunkedWriter, in
+    order. The chunks are memory-mapped, so np.concatenate only what fits in RAM.
+    """
+    chunks = {}
+    for filename in sorted(os.listdir(directory)):
+        if not filename.endswith(".npy"):
+            continue
+        name = filename[:-len(".npy")].rpartition(".")[0]
+        chunks.setdefault(name, []).append(np.load(os.path.join(directory, filename), mmap_mode=mmap_mode))
+    return chunks
+
+
+class P2Quantile:
+    """
+    Online estimate of the p-quantile of a stream with the P-square algorithm
+    (Jain & Chlamtac, 1985): five markers, O(1) memory and time per observation.
+
+    Works elementwise on arrays: with shape=(n,), add takes arrays of shape (n,) and keeps n
+    independent estimates, e.g. one per timestep.
+
+    The P-square estimate interpolates between observations, so on a stream of a few discrete
+    values (e.g. a matrix game's rewards) it can return a value the stream never took. While
+    the stream has taken at most max_levels distinct values, value is instead the exact
+    quantile: the smallest value with at least a fraction p of the observations at or below
+    it (for the median of an even number of observations, the lower middle one).
+    """
+
+    def __init__(self, p=0.5, shape=(), max_levels=16):
+        self.p = p
+        self.shape = shape
+        self.count = 0
+        # the distinct values seen and, elementwise, how often each was seen; None once there
+        # are more than max_levels of them
+        self.max_levels = max_levels
+        self.levels = np.empty(0)
+        self.level_counts = np.zeros((0,) + tuple(shape), dtype=np.int64)
+        self.heights = np.zeros((5,) + tuple(shape))
+        self.positions = np.arange(1.0, 6.0).reshape((5,) + (1,) * len(shape)) * np.ones(shape)
+        self.desired = np.array([1, 1 + 2 * p, 1 + 4 * p, 3 + 2 * p, 5]).reshape((5,) + (1,) * len(shape)) * np.ones(shape)
+        self.increments = np.array([0, p / 2, p, (1 + p) / 2, 1]).reshape((5,) + (1,) * len(shape))
+
+    def _count_level(self, x):
+        levels = self.levels
+        index = np.searchsorted(levels, x)
+        if len(levels) and (levels[np.minimum(index, len(levels) - 1)] == x).all():
+            flat = self.level_counts.reshape(len(levels), -1)
+            flat[index.ravel(), np.arange(flat.shape[1])] += 1
+            return
+        merged = np.union1d(levels, x)
+        if len(merged) > len(levels):
+            if len(merged) > self.max_levels:
+                self.level_counts = None
+                return
+            counts = np.zeros((len(merged),) + tuple(self.shape), dtype=np.int64)
+            counts[np.searchsorted(merged, levels)] = self.level_counts
+            self.levels, self.level_counts = merged, counts
+        flat = self.level_counts.reshape(len(self.levels), -1)
+        flat[np.searchsorted(self.levels, x).ravel(), np.arange(flat.shape[1])] += 1
+
+    def add(self, x):
+        x = np.asarray(x, dtype=float)
+        if self.level_counts is not None:
+            self._count_level(x)
+        if self.count < 5:
+            self.heights[self.count] = x
+            self.count += 1
+            if self.count == 5:
+                self.heights.sort(axis=0)
+            return
+        self.count += 1
+        q, n = self.heights, self.positions
+
+        # the cell x falls in, with the extreme markers extended to include it
+        q[0] = np.minimum(q[0], x)
+        q[4] = np.maximum(q[4], x)
+        k = np.clip((q[1:4] <= x).sum(axis=0), 0, 3)
+        n += np.arange(5).reshape((5,) + (1,) * x.ndim) > k
+        self.desired += self.increments
+
+        for i in (1, 2, 3):
+            d = self.desired[i] - n[i]
+            move = ((d >= 1) & (n[i + 1] - n[i] > 1)) | ((d <= -1) & (n[i - 1] - n[i] < -1))
+            if not np.any(move):
+                continue
+            d = np.sign(d)
+            with np.errstate(divide="ignore", invalid="ignore"):
+                parabolic = q[i] + d / (n[i + 1] - n[i - 1]) * (
+                    (n[i] - n[i - 1] + d) * (q[i + 1] - q[i]) / (n[i + 1] - n[i])
+                    + (n[i + 1] - n[i] - d) * (q[i] - q[i - 1]) / (n[i] - n[i - 1]))
+                neighbour = np.where(d > 0, q[i + 1], q[i - 1])
+                linear = q[i] + d * (neighbour - q[i]) / (np.where(d > 0, n[i + 1], n[i - 1]) - n[i])
+            ordered = (q[i - 1] < parabolic) & (parabolic < q[i + 1])
+            q[i] = np.where(move, np.where(ordered, parabolic, linear), q[i])
+            n[i] = np.where(move, n[i] + d, n[i])
+
+    @property
+    def value(self):
+        if self.count == 0:
+            return np.full(self.shape, np.nan)[()]
+        if self.level_counts is not None:
+            below = (self.level_counts.cumsum(axis=0) < self.p * self.count).sum(axis=0)
+            return self.levels[np.minimum(below, len(self.levels) - 1)][()]
+        if self.count < 5:
+            return np.quantile(self.heights[:self.count], self.p, axis=0)[()]
+        return self.heights[2][()]
+
+
+class RunningMoments:
+    """
+    Online count, mean and variance (Welford), elementwise like P2Quantile.
+    """
+
+    def __init__(self, shape=()):
+        self.count = 0
+        self.mean = np.zeros(shape)
+        self._m2 = np.zeros(shape)
+
+    def add(self, x):
+        self.count += 1
+        delta = x - self.mean
+        self.mean = self.mean + delta / self.count
+        self._m2 = self._m2 + delta * (x - self.mean)
+
+    @property
+    def variance(self):
+        return self._m2 / (self.count - 1) if self.count > 1 else np.zeros_like(self.mean) * np.nan
+
+
+class StreamingStats(Recorder):
+    """
+    Running mean, variance and median of the per-step reward, of each agent's TD error and
+    of the reward accumulated over each episode.
+    """
+
+    def __init__(self, num_agents=2):
+        self.reward = RunningMoments()
+        self.reward_median = P2Quantile()
+        self.td_error = RunningMoments((num_agents,))
+        self.td_error_median = P2Quantile(shape=(num_agents,))
+        self.episode_reward = RunningMoments()
+        self.episode_reward_median = P2Quantile()
+        self._episode_reward = 0
+
+    def record(self, t, reward, actions, temperature, td_errors, done):
+        self.reward.add(reward)
+        self.reward_median.add(reward)
+        td_errors = np.asarray(td_errors, dtype=float)
+        self.td_error.add(td_errors)
+        self.td_error_median.add(td_errors)
+        self._episode_reward += reward
+        if done:
+            self.episode_reward.add(self._episode_reward)
+            self.episode_reward_median.add(self._episode_reward)
+            self._episode_reward = 0
+
+    def summary(self):
+        return {
+            "steps": self.reward.count,
+            "reward_mean": float(self.reward.mean),
+            "reward_median": float(self.reward_median.value),
+            "td_error_mean": self.td_error.mean.tolist(),
+            "td_error_median": np.asarray(self.td_error_median.value).tolist(),
+            "episodes": self.episode_reward.count,
+            "episode_reward_mean": float(self.episode_reward.mean),
+            "episode_reward_median": float(self.episode_reward_median.value),
+        }
+
+
+class PerStepAggregate(Recorder):
+    """
+    Mean and (P-square) median over trials of the notebooks' reward matrix, one timestep at a
+    time: entry t of a trial is the reward accumulated over the episode that ended at step t,
+    and 0 elsewhere. Only the current trial's row is held, so memory is O(timesteps) instead
+    of O(num_trials * timesteps).
+
+    Feed it steps through record and call end_trial after each trial, or pass whole rows
+    (e.g. from runner.run_trials) to add_trial.
+    """
+
+    def __init__(self, timesteps):
+        self.timesteps = timesteps
+        self.moments = RunningMoments((timesteps,))
+        self.median = P2Quantile(shape=(timesteps,))
+        self._row = np.zeros(timesteps)
+        self._episode_reward = 0
+
+    def record(self, t, reward, actions, temperature, td_errors, done):
+        self._episode_reward += reward
+        if done or t == self.timesteps - 1:
+            self._row[t] = self._episode_reward
+            self._episode_reward = 0
+
+    def end_trial(self):
+        self.add_trial(self._row)
+        self._row = np.zeros(self.timesteps)
+        self._episode_reward = 0
+
+    def add_trial(self, row):
+        row = np.asarray(row, dtype=float)
+        self.moments.add(row)
+        self.median.add(row)
+
+    @property
+    def num_trials(self):
+        return self.moments.count
+
+    @property
+    def mean(self):
+        return self.moments.mean
@@ -0,0 +1,195 @@
+"""
+Steps any number of independent learners that observe the same state.
+
+AgentGroup(agents) chooses the joint action and updates every agent in one call each. When
+the agents share a backend (dense or encoded Q-tables over the same states and actions, and
+policies that can select in batch, see policy.epsilon_greedy), their tables are stacked into
+one (num_agents, num_states, num_actions) array and a step costs a fixed number of NumPy
+calls, however many agents there are. Otherwise the group falls back to calling each agent.
+
+Batching trades per-agent Python calls for a fixed set of NumPy calls, which only pays off
+with enough agents: on a 5-action table a batched step costs about as much as stepping 8
+agents one by one, so by default smaller groups are stepped agent by agent.
+
+simulate_task accepts an AgentGroup wherever it takes a list of agents.
+"""
+import random
+
+import numpy as np
+
+from HystereticQLearner import HystereticQLearner
+from qtable import EncodedQTable, LazyQTable
+from schedules import constant_value
+
+BATCH_MIN_AGENTS = 8
+
+
+class _Parameters:
+    """
+    One rate or policy parameter per agent: numbers or callables. Agents usually share them, so
+    each distinct one is evaluated once per step, and a single shared one gives a scalar.
+    Callables wrapping the same rate (with its key attribute, as epsilon_greedy's) are the same.
+    """
+
+    def __init__(self, parameters):
+        unique = {}
+        keys = [id(getattr(p, "key", p)) for p in parameters]
+        self.index = np.array([unique.setdefault(key, len(unique)) for key in keys])
+        by_id = dict(zip(keys, parameters))
+        # numbers and constant schedules are stored as their value
+        self.unique = [p if constant_value(p) is None else constant_value(p)
+                       for p in (by_id[key] for key in unique)]
+
+    def evaluate(self, *args, **kwargs):
+        values = [p(*args, **kwargs) if callable(p) else p for p in self.unique]
+        if len(values) == 1:
+            return values[0]
+        return np.array(values)[self.index]
+
+
+def can_batch(agents):
+    """
+    Whether the agents share a backend AgentGroup can step in batch.
+    """
+    tables = [getattr(agent, "q_table", None) for agent in agents]
+    if not agents or any(table is None or isinstance(table, LazyQTable) for table in tables):
+        return False
+    first = tables[0]
+    for table in tables:
+        if type(table) is not type(first) or table.array.shape != first.array.shape or table.actions != first.actions:
+            return False
+        if not isinstance(table, EncodedQTable) and table.states != first.states:
+            return False
+    return all(hasattr(agent.policy, "select_batch") for agent in agents)
+
+
+class AgentGroup:
+    """
+    agents: a list of learners acting on the same environment.
+    rng: a numpy Generator or seed for batched action selection. By default it is seeded from
+    the global `random` generator, so runs seeded with random.seed stay reproducible.
+    batch: True to step the agents in batch whenever they share a backend, False never to.
+    By default groups of at least BATCH_MIN_AGENTS agents are batched.
+
+    In batch mode the agents' QTables are rebound to views of the group's stacked arrays, so
+    agent.q_values and agent.q_table keep reading the live values. Don't call refresh() on
+    one of those tables afterwards; call the group's refresh() instead.
+    """
+
+    def __init__(self, agents, rng=None, batch=None):
+        self.agents = list(agents)
+        if batch is None:
+            batch = len(self.agents) >= BATCH_MIN_AGENTS
+        self.batched = batch and can_batch(self.agents)
+        if rng is None:
+            rng = random.getrandbits(64)
+        self.rng = np.random.default_rng(rng)
+        if self.batched:
+            self._stack()
+
+    def __len__(self):
+        return len(self.agents)
+
+    def __iter__(self):
+        return iter(self.agents)
+
+    def __getitem__(self, index):
+        return self.agents[index]
+
+    def _stack(self):
+        agents = self.agents
+        tables = [agent.q_table for agent in agents]
+        self.table = tables[0]
+        self.actions = tables[0].actions
+        self.array = np.stack([table.array for table in tables])
+        self.refresh()
+        for k, table in enumerate(tables):
+            table.array = self.array[k]
+            table.max_values = self.max_values[k]
+            table.greedy = self.greedy[k]
+            table.num_greedy = self.num_greedy[k]
+            if table is not agents[k].q_values:
+                agents[k].q_values = table
+
+        self.agent_index = np.arange(len(agents))
+        # agents are split by batch selection function; usually there is a single part
+        parts = {}
+        for k, agent in enumerate(agents):
+            parts.setdefault(agent.policy.select_batch, []).append(k)
+        self.policy_parts = [(select, np.array(indices), _Parameters([agents[k].policy.batch_parameter for k in indices]))
+                             for select, indices in parts.items()]
+        self.learning_rates = _Parameters([agent.get_learning_rate for agent in agents])
+        self.decrease_rates = _Parameters([agent.get_decrease_rate if isinstance(agent, HystereticQLearner) else agent.get_learning_rate
+                                           for agent in agents])
+        self.discount_rates = _Parameters([agent.get_discount_rate for agent in agents])
+        self.encoded = isinstance(self.table, EncodedQTable)
+
+    def refresh(self):
+        """
+        Rebuilds the greedy caches of every agent's table from the stacked array.
+        """
+        array = self.array
+        self.max_values = array.max(axis=2)
+        is_max = array == self.max_values[..., None]
+        self.greedy = is_max.argmax(axis=2)
+        self.num_greedy = is_max.sum(axis=2)
+        for k, agent in enumerate(self.agents):
+            table = agent.q_table
+            table.max_values = self.max_values[k]
+            table.greedy = self.greedy[k]
+            table.num_greedy = self.num_greedy[k]
+
+    def _index(self, state):
+        return state if self.encoded else self.table.index_of(state)
+
+    def act(self, state, *args, t=None):
+        """
+        Returns the joint action of the agents in state. args and t are passed to the policies,
+        as in Agent.action_selection (e.g. the system temperature and the timestep).
+        """
+        if not self.batched:
+            return tuple(agent.action_selection(state, None, *args, t=t) for agent in self.agents)
+        values = self.array[:, self._index(state)]
+        if len(self.policy_parts) == 1:
+            select, _, parameters = self.policy_parts[0]
+            indices = select(values, parameters.evaluate(*args, t=t), self.rng)
+        else:
+            indices = np.empty(len(self.agents), dtype=np.intp)
+            for select, part, parameters in self.policy_parts:
+                indices[part] = select(values[part], parameters.evaluate(*args, t=t), self.rng)
+        actions = self.actions
+        joint_action = tuple(actions[i] for i in indices.tolist())
+        for agent, action in zip(self.agents, joint_action):
+            agent.action = action
+        return joint_action
+
+    def update(self, state, joint_action, new_state, reward, t=None):
+        """
+        Updates every agent with its own action of joint_action and the shared reward.
+        """
+        agents = self.agents
+        if not self.batched:
+            for agent, action in zip(agents, joint_action):
+                agent.update(state, action, new_state, reward, t)
+            return
+        s = self._index(state)
+        next_max = self.max_values[:, self._index(new_state)]
+        action_index = self.table.action_index
+        actions = np.array([action_index[action] for action in joint_action])
+        k = self.agent_index
+
+        old = self.array[k, s, actions]
+        delta = reward + self.discount_rates.evaluate(t) * next_max - old
+        rate = np.where(delta >= 0, self.learning_rates.evaluate(t), self.decrease_rates.evaluate(t))
+        self.array[k, s, actions] = old + delta * rate
+
+        rows = self.array[:, s]
+        best = rows.max(axis=1)
+        is_max = rows == best[:, None]
+        self.max_values[:, s] = best
+        self.greedy[:, s] = is_max.argmax(axis=1)
+        self.num_greedy[:, s] = is_max.sum(axis=1)
+
+        for agent, td_error in zip(agents, delta.tolist()):
+            agent.accumulated_reward += reward
+            agent.td_error = td_error
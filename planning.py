@@ -0,0 +1,129 @@
+"""
+Optimal joint-action values of enumerable environments, by value iteration.
+
+solve(environment) compiles the environment (see compiled.py) and iterates
+    Q(s, a) = E[r | s, a] + discount_rate * V(s')   with V(s') = max Q(s', .), 0 if s' is terminal
+over all states and joint actions at once, where E[r | s, a] averages the equally likely
+rewards of a stochastic reward tuple. Terminal states are worth 0 because an episode ends
+there, as the learners see it: simulate_task restarts from the start state and a terminal
+state's Q-values are never updated.
+
+The result is a ground truth for the learners: the optimal joint policy, the value of the
+start state, the optimistic per-agent values a hysteretic learner converges to, and the
+expected reward per timestep of acting optimally (the "best" lines of the notebooks).
+"""
+import numpy as np
+
+
+class Solution:
+    """
+    q:          (num_states, num_actions, ..., num_actions) optimal joint-action values, one
+                action axis per agent;
+    values:     (num_states,) optimal state values;
+    policy:     (num_states, num_agents) action codes of the first greedy joint action;
+    rewards:    q.shape expected immediate rewards;
+    iterations: the number of sweeps value iteration took.
+    """
+
+    def __init__(self, environment, q, rewards, discount_rate, iterations):
+        self.environment = environment
+        self.q = q
+        self.rewards = rewards
+        self.discount_rate = discount_rate
+        self.iterations = iterations
+        num_states = q.shape[0]
+        flat = q.reshape(num_states, -1)
+        self.values = flat.max(axis=1)
+        joint = flat.argmax(axis=1)
+        self.policy = np.stack(np.unravel_index(joint, q.shape[1:]), axis=1)
+
+    @property
+    def start_value(self):
+        return float(self.values[self.environment.start_code])
+
+    def joint_action(self, state):
+        """
+        The optimal joint action (in the environment's action values) in state.
+        """
+        environment = self.environment
+        codes = self.policy[environment.encode_state(state)]
+        return tuple(environment.decode_action(int(code)) for code in codes)
+
+    def agent_values(self, k):
+        """
+        (num_states, num_actions) values of agent k's own actions, maximized over the other
+        agents' actions: what an optimistic (e.g. hysteretic) learner's table converges to.
+        """
+        axes = tuple(axis for axis in range(1, self.q.ndim) if axis != k + 1)
+        return self.q.max(axis=axes) if axes else self.q
+
+    def expected_rewards(self, timesteps):
+        """
+        Expected reward at each of timesteps steps of following the optimal policy from the
+        start state, restarting from it after every terminal state like simulate_task.
+        """
+        environment = self.environment
+        next_states = environment.next_states
+        terminal = environment.terminal
+        rewards = np.empty(timesteps)
+        code = environment.start_code
+        for t in range(timesteps):
+            if terminal[code]:
+                code = environment.start_code
+            index = (code,) + tuple(self.policy[code])
+            rewards[t] = self.rewards[index]
+            code = int(next_states[index])
+        return rewards
+
+
+def expected_rewards(compiled):
+    """
+    Mean of the equally likely rewards of every (state, joint action) of a CompiledEnvironment.
+    """
+    counts = compiled.reward_counts
+    real = np.arange(compiled.reward_values.shape[-1]) < counts[..., np.newaxis]
+    return np.where(real, compiled.reward_values, 0.0).sum(axis=-1) / counts
+
+
+def value_iteration(compiled, discount_rate=0.9, tolerance=1e-10, max_iterations=100000):
+    """
+    Returns (q, rewards, iterations) for a CompiledEnvironment. Stops when no state value
+    changes by more than tolerance in a sweep, or after max_iterations sweeps.
+    """
+    rewards = expected_rewards(compiled)
+    num_states = rewards.shape[0]
+    flat_rewards = rewards.reshape(num_states, -1)
+    next_states = compiled.next_states.reshape(num_states, -1)
+    # a transition into a terminal state has no continuation
+    continuation = discount_rate * ~compiled.terminal[next_states]
+
+    values = np.zeros(num_states)
+    q = flat_rewards.copy()
+    iterations = 0
+    while iterations < max_iterations:
+        iterations += 1
+        np.multiply(continuation, values[next_states], out=q)
+        q += flat_rewards
+        new_values = q.max(axis=1)
+        change = np.abs(new_values - values).max()
+        values = new_values
+        if change <= tolerance:
+            break
+    return q.reshape(rewards.shape), rewards, iterations
+
+
+def solve(environment, discount_rate=0.9, tolerance=1e-10, max_iterations=100000, cache_path=None):
+    """
+    Solves environment (an Environment implementing enumerate_outcomes, or a
+    CompiledEnvironment) and returns a Solution. cache_path is passed to
+    Environment.compile.
+
+    discount_rate can be 1 for episodic tasks whose optimal policy reaches a terminal state
+    from everywhere reachable, like GridWorld.
+    """
+    from compiled import CompiledEnvironment
+
+    if not isinstance(environment, CompiledEnvironment):
+        environment = environment.compile(cache_path)
+    q, rewards, iterations = value_iteration(environment, discount_rate, tolerance, max_iterations)
+    return Solution(environment, q, rewards, discount_rate, iterations)
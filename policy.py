@@ -1,32 +1,77 @@
 import random
 
+from schedules import constant_value
+
 
 def epsilon_greedy(epsilon):
     """
-    epsilon is the probability of taking a random action; i.e the exploration rate.
+    epsilon is the probability of taking a random action; i.e the exploration rate. It is a
+    number or a callable: a schedule of the timestep t when the policy is given t=t (as
+    simulate_task does), and otherwise called with the policy's extra positional arguments.
+
+    The returned policy also has a select_from_table(table, state, *args, t=None) attribute, used by
+    agents with a dense QTable: exploit steps then read the table's cached greedy action
+    instead of scanning the values.
+
+    It also has select_batch and batch_parameter attributes, used by multiagent.AgentGroup to
+    choose the actions of many agents in one call: select_batch(values, parameters, rng) with
+    parameters holding each agent's batch_parameter, a number or a callable of the policy args
+    (and t=t).
     """
-    def policy(options, values, *args):
+    # read once when epsilon is a number or a constant schedule (see schedules.py)
+    constant = constant_value(epsilon)
+
+    def exploration_rate(*args, t=None):
+        if(constant is not None):
+            return constant
+        return epsilon(t) if t is not None else epsilon(*args)
+
+    def policy(options, values, *args, t=None):
         r = random.random()
-        if(callable(epsilon)):
-            e = epsilon(*args)
-        else:
-            e = epsilon
+        e = constant if constant is not None else exploration_rate(*args, t=t)
 
         if(r >= e):
             # exploit
-            max_options = []
+            if(hasattr(values, "tolist")):
+                values = values.tolist()
             max_value = max(values)
 
             indices = [index for index, value in enumerate(
                 values) if value == max_value]
             return options[random.choice(indices)]
-
-            # for i, val in enumerate(values):
-            #     if(val == max_value):
-            #         max_options.append(options[i])
-            # return random.choice(max_options)
         else:
             # explore
             return random.choice(options)
 
+    def select_from_table(table, state, *args, t=None):
+        r = random.random()
+        e = constant if constant is not None else exploration_rate(*args, t=t)
+
+        if(r >= e):
+            # exploit; ties are broken uniformly by the table
+            return table.actions[table.greedy_index(state)]
+        else:
+            # explore
+            return random.choice(table.actions)
+
+    policy.select_from_table = select_from_table
+    policy.select_batch = epsilon_greedy_batch
+    exploration_rate.constant = constant
+    exploration_rate.key = epsilon
+    policy.batch_parameter = exploration_rate
     return policy
+
+
+def epsilon_greedy_batch(values, epsilon, rng):
+    """
+    values: (..., num_actions) array. Returns one action index per row: uniformly random
+    with probability epsilon and greedy otherwise, breaking ties uniformly at random.
+    epsilon is a number or an array of shape values.shape[:-1]. rng is a numpy Generator.
+    """
+    import numpy as np
+
+    shape = values.shape[:-1]
+    is_max = values == values.max(axis=-1, keepdims=True)
+    greedy = np.argmax(is_max * rng.random(values.shape), axis=-1)
+    explore = rng.random(shape) < epsilon
+    return np.where(explore, rng.integers(0, values.shape[-1], size=shape), greedy)
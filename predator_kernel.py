@@ -0,0 +1,175 @@
+"""
+Vectorized Predator2 dynamics: steps many independent predator episodes at once on integer
+coordinate arrays.
+
+Each episode has a mouse and two predators on a 10x10 torus. A step follows
+Predator2.respond_to_action:
+    - with probability 0.2 both predators slip and each takes a uniformly random action;
+    - predators landing on the same cell crash (-50);
+    - a predator landing on the mouse captures it (+10) if the other predator is next to the
+      mouse, and fails (-50) otherwise;
+    - otherwise, with probability 0.8, the mouse moves to a uniformly chosen neighbouring cell
+      that no predator occupies.
+Terminal episodes restart from a fresh random start, as simulate_task does through
+Predator2.start_state.
+
+States are reported as Predator2 state codes (see encode_relative_state), actions as
+Predator2 action codes (see PREDATOR2_MOVES).
+"""
+import numpy as np
+
+from environment import PREDATOR2_MOVES, encode_relative_state
+
+MOVES = np.array(PREDATOR2_MOVES)
+SUPPORT_STATES = np.array([(1, 0), (-1, 0), (0, 1), (0, -1)])
+
+
+def relative_positions(mouse, predators):
+    """
+    mouse: (..., 2), predators: (..., num_predators, 2) true coordinates.
+    Returns each predator's position relative to the mouse, in [-4, 5].
+    """
+    return (predators - mouse[..., None, :] + 4) % 10 - 4
+
+
+def encode_relative_positions(relative):
+    """
+    Vectorized encode_relative_state for (..., 2, 2) relative positions.
+    """
+    x1, y1 = relative[..., 0, 0], relative[..., 0, 1]
+    x2, y2 = relative[..., 1, 0], relative[..., 1, 1]
+    return (((x1 + 4) * 10 + y1 + 4) * 10 + x2 + 4) * 10 + y2 + 4
+
+
+class PredatorBatch:
+    def __init__(self, num_episodes, rng=None):
+        self.num_episodes = num_episodes
+        self.rng = np.random.default_rng(rng)
+        self.mouse = np.zeros((num_episodes, 2), dtype=np.intp)
+        self.predators = np.zeros((num_episodes, 2, 2), dtype=np.intp)
+        self.capture_count = np.zeros(num_episodes, dtype=np.intp)
+        self.reset()
+
+    def reset(self, mask=None):
+        """
+        Puts the mouse and the predators of the masked episodes (all by default) on three
+        distinct random cells.
+        """
+        if mask is None:
+            mask = np.ones(self.num_episodes, dtype=bool)
+        count = int(mask.sum())
+        if count == 0:
+            return
+        cells = self.rng.random((count, 100)).argsort(axis=1)[:, :3]
+        positions = np.stack(np.divmod(cells, 10), axis=-1)
+        self.mouse[mask] = positions[:, 0]
+        self.predators[mask] = positions[:, 1:]
+
+    def get_states(self):
+        return encode_relative_positions(relative_positions(self.mouse, self.predators))
+
+    def step(self, actions):
+        """
+        actions: (num_episodes, 2) predator action codes.
+        Returns rewards, new state codes and terminal flags, each of shape (num_episodes,).
+        """
+        rng = self.rng
+        n = self.num_episodes
+        actions = np.asarray(actions)
+
+        slip = rng.random(n) < 0.2
+        actions = np.where(slip[:, None], rng.integers(0, 5, size=(n, 2)), actions)
+        predators = (self.predators + MOVES[actions]) % 10
+        relative = relative_positions(self.mouse, predators)
+
+        crash = (predators[:, 0] == predators[:, 1]).all(axis=-1)
+        caught = (predators == self.mouse[:, None]).all(axis=-1).any(axis=-1) & ~crash
+        supported = (relative[:, :, None] == SUPPORT_STATES).all(axis=-1).any(axis=(1, 2))
+        captured = caught & supported
+        terminal = crash | caught
+        rewards = np.where(captured, 10, np.where(terminal, -50, 0))
+        self.capture_count += captured
+
+        # the mouse flees to a free neighbouring cell
+        moving = ~terminal & (rng.random(n) >= 0.2)
+        candidates = (self.mouse[:, None] + MOVES[:4]) % 10
+        free = ~(candidates[:, :, None] == predators[:, None]).all(axis=-1).any(axis=-1)
+        choice = (free * rng.random((n, 4))).argmax(axis=1)
+        mouse = np.where(moving[:, None], candidates[np.arange(n), choice], self.mouse)
+
+        states = np.where(terminal, encode_relative_positions(relative),
+                          encode_relative_positions(relative_positions(mouse, predators)))
+        self.mouse = mouse
+        self.predators = predators
+        self.reset(terminal)
+        return rewards, states, terminal
+
+
+def _sample_batch(start, joint, samples, rng, chunk_size=100000):
+    # PredatorBatch steps from start, in chunks to bound the memory of the resets
+    from collections import Counter
+
+    outcomes = Counter()
+    for offset in range(0, samples, chunk_size):
+        size = min(chunk_size, samples - offset)
+        batch = PredatorBatch(size, rng)
+        batch.mouse[:] = start[0]
+        batch.predators[:] = start[1:]
+        rewards, states, _ = batch.step(np.tile(joint, (size, 1)))
+        outcomes.update(zip(rewards.tolist(), states.tolist()))
+    return outcomes
+
+
+def verify_against_predator2(samples=200000, batch_samples=1000000, seed=0, tolerance=0.01):
+    """
+    Checks that PredatorBatch and Predator2 have the same transition and reward distribution.
+
+    From a few start configurations and joint actions, steps Predator2.respond_to_action (with
+    the action names) samples times and PredatorBatch batch_samples times, and compares the
+    empirical distributions of (reward, next state code) by total variation distance. With the
+    defaults the sampling noise is about 0.006 (and the check takes about 30 seconds); with
+    samples=10000 and batch_samples=100000, as the tests run it, about 0.027. Raises
+    AssertionError when a distance exceeds tolerance, otherwise returns the largest distance
+    seen.
+    """
+    import random
+    from collections import Counter
+
+    from environment import Predator2
+
+    random.seed(seed)
+    rng = np.random.default_rng(seed)
+    task = Predator2()
+    starts = [
+        [(5, 5), (5, 3), (5, 7)],   # mouse boxed in vertically
+        [(5, 5), (4, 5), (5, 4)],   # both predators next to the mouse
+        [(0, 0), (9, 0), (2, 2)],   # across the torus edge
+        [(3, 3), (3, 4), (3, 6)],   # predators that can crash
+    ]
+    # (right, stay) captures or fails across the edge; (down, up) crashes or boxes the mouse in
+    worst = 0.0
+    for start in starts:
+        for joint in [(1, 4), (3, 2)]:
+            names = tuple(task.action_space[a] for a in joint)
+            expected = Counter()
+            for _ in range(samples):
+                task.current_true_state = list(start)
+                reward, state = task.respond_to_action(names)
+                expected[(reward, encode_relative_state(state))] += 1
+            observed = _sample_batch(start, joint, batch_samples, rng)
+
+            distance = sum(abs(expected[k] / samples - observed[k] / batch_samples)
+                           for k in set(expected) | set(observed)) / 2
+            assert distance <= tolerance, "start {} actions {}: distance {:.4f}".format(start, names, distance)
+            worst = max(worst, distance)
+    # the relative coordinates must match Predator2's own conversion for every pair of cells
+    cells = [(x, y) for x in range(10) for y in range(10)]
+    relative = relative_positions(np.array(cells), np.array(cells)[None].repeat(100, axis=0))
+    for i, mouse in enumerate(cells):
+        for j, predator in enumerate(cells):
+            assert tuple(relative[i, j].tolist()) == task.process_mouse_pred(mouse, predator)
+    return worst
+
+
+if __name__ == "__main__":
+    print("max total variation distance: {:.4f}".format(verify_against_predator2()))
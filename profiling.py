@@ -0,0 +1,186 @@
+"""
+Where simulate_task spends its time.
+
+simulate_task(..., profiler=profiler) times every step in four phases:
+    select:      the agents' action_selection (or AgentGroup.act);
+    respond:     the task's respond_to_action;
+    update:      the agents' update (or AgentGroup.update);
+    bookkeeping: the rest of the step (temperature schedule and decay, replay, metrics).
+Without a profiler simulate_task only pays a few `is not None` checks per step.
+
+A Profiler keeps
+    - the cumulative time and call count of every phase, and of whole steps;
+    - latency histograms (power-of-two nanosecond buckets) of every phase, over every
+      sample_every-th step;
+    - the growth of the agents' Q-tables (states held, bytes), every table_every steps;
+    - with trace, the sampled steps as timed events (at most max_events of them).
+report() returns all of it as a dict, summary() as a table. write_trace writes the Chrome
+trace event format (chrome://tracing, Perfetto, speedscope) and write_collapsed the collapsed
+stacks flamegraph.pl reads.
+"""
+import json
+import sys
+from time import perf_counter_ns
+
+import numpy as np
+
+SELECT = 0
+RESPOND = 1
+UPDATE = 2
+BOOKKEEPING = 3
+PHASES = ("select", "respond", "update", "bookkeeping")
+# latency buckets: bucket b holds durations of less than 2**b ns
+NUM_BUCKETS = 40
+
+
+def q_table_size(agent):
+    """
+    (states, bytes) of agent's Q-values: the number of states holding values and the memory
+    they take (the arrays of a dense table, an estimate of the dicts otherwise).
+    """
+    q_table = getattr(agent, "q_table", None)
+    if q_table is not None:
+        nbytes = sum(getattr(q_table, name).nbytes for name in ("array", "max_values", "num_greedy")
+                     if isinstance(getattr(q_table, name, None), np.ndarray))
+        return len(q_table), nbytes
+    q_values = getattr(agent, "q_values", None)
+    if q_values is None:
+        return 0, 0
+    nbytes = sys.getsizeof(q_values)
+    for state, values in q_values.items():
+        nbytes += sys.getsizeof(state) + sys.getsizeof(values) + sum(sys.getsizeof(v) for v in values.values())
+    return len(q_values), nbytes
+
+
+class Profiler:
+    def __init__(self, sample_every=1, table_every=1000, trace=False, max_events=100000):
+        self.sample_every = sample_every
+        self.table_every = table_every
+        self.trace = trace
+        self.max_events = max_events
+        self.totals = [0] * len(PHASES)
+        self.calls = [0] * len(PHASES)
+        self.histograms = np.zeros((len(PHASES), NUM_BUCKETS), dtype=np.int64)
+        self.step_histogram = np.zeros(NUM_BUCKETS, dtype=np.int64)
+        self.steps = 0
+        self.step_total = 0
+        self.table_sizes = []
+        self.events = []
+        self.origin = perf_counter_ns()
+        self._laps = [0] * len(PHASES)
+        self._step_start = 0
+
+    # Called by simulate_task
+    def start_step(self):
+        now = perf_counter_ns()
+        self._step_start = now
+        return now
+
+    def lap(self, phase, mark):
+        """
+        Charges the time since mark to phase and returns the new mark.
+        """
+        now = perf_counter_ns()
+        self._laps[phase] += now - mark
+        return now
+
+    def end_step(self, t, mark, agents):
+        now = perf_counter_ns()
+        laps = self._laps
+        laps[BOOKKEEPING] += now - mark
+        step = now - self._step_start
+        totals = self.totals
+        calls = self.calls
+        for phase in range(len(PHASES)):
+            totals[phase] += laps[phase]
+            calls[phase] += 1
+        self.step_total += step
+        self.steps += 1
+        if self.steps % self.sample_every == 0:
+            for phase in range(len(PHASES)):
+                self.histograms[phase, min(laps[phase].bit_length(), NUM_BUCKETS - 1)] += 1
+            self.step_histogram[min(step.bit_length(), NUM_BUCKETS - 1)] += 1
+            if self.trace and len(self.events) < self.max_events:
+                self.events.append((t, self._step_start - self.origin, tuple(laps)))
+        if self.steps % self.table_every == 0:
+            self.record_tables(t, agents)
+        laps[:] = (0, 0, 0, 0)
+
+    def record_tables(self, t, agents):
+        agents = getattr(agents, "agents", agents)
+        elapsed = perf_counter_ns() - self.origin
+        self.table_sizes.append((t, elapsed, [q_table_size(agent) for agent in agents]))
+
+    # Results
+    def report(self):
+        """
+        A dict of plain values: per phase the calls, total and mean seconds and share of the
+        step time, the step totals, the latency histograms as {bucket upper bound in ns: count},
+        and the sampled Q-table sizes.
+        """
+        step_total = self.step_total or 1
+
+        def histogram(counts):
+            return {2 ** b: int(count) for b, count in enumerate(counts) if count}
+
+        phases = {}
+        for phase, name in enumerate(PHASES):
+            calls = self.calls[phase]
+            phases[name] = {
+                "calls": calls,
+                "seconds": self.totals[phase] / 1e9,
+                "mean_us": self.totals[phase] / calls / 1e3 if calls else 0.0,
+                "share": self.totals[phase] / step_total,
+                "histogram_ns": histogram(self.histograms[phase]),
+            }
+        return {
+            "steps": self.steps,
+            "seconds": self.step_total / 1e9,
+            "mean_step_us": self.step_total / self.steps / 1e3 if self.steps else 0.0,
+            "step_histogram_ns": histogram(self.step_histogram),
+            "phases": phases,
+            "q_tables": [{"t": t, "states": [size[0] for size in sizes], "bytes": [size[1] for size in sizes]}
+                         for t, _, sizes in self.table_sizes],
+        }
+
+    def summary(self):
+        report = self.report()
+        lines = ["{} steps, {:.3f}s, {:.2f}us/step".format(report["steps"], report["seconds"], report["mean_step_us"]),
+                 "{:<12} {:>10} {:>10} {:>8}".format("phase", "seconds", "us/call", "share")]
+        for name, phase in report["phases"].items():
+            lines.append("{:<12} {:>10.4f} {:>10.2f} {:>7.1%}".format(name, phase["seconds"], phase["mean_us"], phase["share"]))
+        if report["q_tables"]:
+            last = report["q_tables"][-1]
+            lines.append("Q-tables at t={}: states {}, bytes {}".format(last["t"], last["states"], last["bytes"]))
+        return "\n".join(lines)
+
+    def write_trace(self, path):
+        """
+        Writes the traced steps (profiled with trace=True) and the Q-table sizes as a Chrome
+        trace event file: one "step" event per sampled step, with its phases nested inside,
+        in the order they ran; bookkeeping is shown last.
+        """
+        events = []
+        for t, start, laps in self.events:
+            ts = start / 1e3
+            events.append({"name": "step", "ph": "X", "pid": 1, "tid": 1, "ts": ts,
+                           "dur": sum(laps) / 1e3, "args": {"t": t}})
+            for phase, name in enumerate(PHASES):
+                events.append({"name": name, "ph": "X", "pid": 1, "tid": 1, "ts": ts, "dur": laps[phase] / 1e3})
+                ts += laps[phase] / 1e3
+        for t, elapsed, sizes in self.table_sizes:
+            args = {}
+            for k, (states, nbytes) in enumerate(sizes):
+                args["agent{}_states".format(k)] = states
+                args["agent{}_bytes".format(k)] = nbytes
+            events.append({"name": "q_tables", "ph": "C", "pid": 1, "ts": elapsed / 1e3, "args": args})
+        with open(path, "w") as f:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ns"}, f)
+
+    def write_collapsed(self, path):
+        """
+        Writes the cumulative phase times as collapsed stacks ("simulate_task;phase ns").
+        """
+        with open(path, "w") as f:
+            for phase, name in enumerate(PHASES):
+                f.write("simulate_task;{} {}\n".format(name, self.totals[phase]))
@@ -0,0 +1,421 @@
+from collections.abc import Mapping, MutableMapping
+from random import randrange
+
+import numpy as np
+
+
+# update_batch falls back to a plain loop when its vectorized passes average fewer transitions
+MIN_PASS_SIZE = 16
+
+
+def _occurrence_passes(cells):
+    """
+    Splits transition indices into passes: pass k holds the k-th occurrence of every cell.
+    """
+    order = np.argsort(cells, kind="stable")
+    sorted_cells = cells[order]
+    n = len(cells)
+    group_start = np.flatnonzero(np.r_[True, sorted_cells[1:] != sorted_cells[:-1]])
+    rank = np.empty(n, dtype=np.intp)
+    rank[order] = np.arange(n) - np.repeat(group_start, np.diff(np.r_[group_start, n]))
+    by_rank = np.argsort(rank, kind="stable")
+    return np.split(by_rank, np.cumsum(np.bincount(rank))[:-1])
+
+
+def _last_before(keys, queries):
+    """
+    For each i, the last j < i with keys[j] == queries[i], or -1.
+    """
+    n = len(keys)
+    positions = np.arange(n)
+    sorted_keys = np.sort(keys * n + positions)
+    found = np.searchsorted(sorted_keys, queries * n + positions) - 1
+    candidate = sorted_keys[np.maximum(found, 0)]
+    return np.where((found >= 0) & (candidate // n == queries), candidate % n, -1)
+
+
+def _conflict_free_runs(cells, states, next_states):
+    """
+    Splits transitions into runs of consecutive ones where none updates a cell an earlier one
+    of the run updated, or reads the max of a row an earlier one of the run wrote to.
+    """
+    conflict = np.maximum(_last_before(cells, cells), _last_before(states, next_states)).tolist()
+    starts = [0]
+    start = 0
+    for i, previous in enumerate(conflict):
+        if previous >= start:
+            starts.append(i)
+            start = i
+    bounds = starts + [len(cells)]
+    return [slice(bounds[i], bounds[i + 1]) for i in range(len(starts))]
+
+
+class QRow(MutableMapping):
+    """
+    Dict-like view of one state's action values in a QTable.
+    Reads and writes go straight to the underlying array.
+    """
+
+    def __init__(self, table, index):
+        self.table = table
+        self.index = index
+
+    def __getitem__(self, action):
+        return self.table.array[self.index, self.table.action_index[action]]
+
+    def __setitem__(self, action, value):
+        self.table.set_index_value(self.index, self.table.action_index[action], value)
+
+    def __delitem__(self, action):
+        raise TypeError("Actions cannot be removed from a QTable row")
+
+    def __iter__(self):
+        return iter(self.table.actions)
+
+    def __len__(self):
+        return len(self.table.actions)
+
+    def __repr__(self):
+        return repr(dict(self.items()))
+
+
+class QTable(Mapping):
+    """
+    Dense Q-table: states and actions are mapped to integer indices once, and the
+    values live in a single (num_states, num_actions) float array.
+
+    Indexing the table with a state (q_table[state][action]) returns a QRow, so code
+    written against the dict-of-dicts q_values keeps working.
+
+    For every row the table also caches the max value, one greedy action and how many
+    actions share the max. The cache is kept up to date by set_value, so max_value and
+    greedy_index are O(1) except when a row's only greedy action loses value. Code that
+    writes to array directly must call refresh() afterwards.
+    """
+
+    def __init__(self, states, actions, initial_value=0, dtype=np.float64):
+        self.states = list(states)
+        self.actions = list(actions)
+        self.state_index = {state: i for i, state in enumerate(self.states)}
+        self.action_index = {action: i for i, action in enumerate(self.actions)}
+        self.array = np.full((len(self.states), len(self.actions)), initial_value, dtype=dtype)
+        self.refresh()
+
+    @classmethod
+    def for_environment(cls, environment, initial_value=0):
+        action_space = environment.get_action_space()
+        if(callable(action_space)):
+            raise ValueError("A dense QTable needs a fixed action space")
+        return cls(environment.get_state_space(), action_space, initial_value)
+
+    @classmethod
+    def from_array(cls, states, actions, array):
+        """
+        Wraps an existing (num_states, num_actions) array without copying it, e.g. one
+        memory-mapped by checkpoint.load_agent.
+        """
+        table = cls.__new__(cls)
+        table.states = list(states)
+        table.actions = list(actions)
+        table.state_index = {state: i for i, state in enumerate(table.states)}
+        table.action_index = {action: i for i, action in enumerate(table.actions)}
+        table.array = array
+        table.refresh()
+        return table
+
+    def refresh(self):
+        """
+        Rebuilds the greedy cache from array.
+        """
+        self.max_values = self.array.max(axis=1)
+        is_max = self.array == self.max_values[:, None]
+        self.greedy = is_max.argmax(axis=1)
+        self.num_greedy = is_max.sum(axis=1)
+
+    def index_of(self, state):
+        return self.state_index[state]
+
+    def indices_of(self, states):
+        index_of = self.index_of
+        return np.array([index_of(state) for state in states], dtype=np.intp)
+
+    def action_indices_of(self, actions):
+        action_index = self.action_index
+        return np.array([action_index[action] for action in actions], dtype=np.intp)
+
+    def row(self, state):
+        index = self.index_of(state)
+        return self.array[index]
+
+    def get_value(self, state, action):
+        return self.array.item(self.index_of(state), self.action_index[action])
+
+    def set_value(self, state, action, value):
+        self.set_index_value(self.index_of(state), self.action_index[action], value)
+
+    def max_value(self, state):
+        return self.max_values.item(self.index_of(state))
+
+    def greedy_index(self, state, break_ties=True):
+        return self.greedy_index_at(self.index_of(state), break_ties)
+
+    def set_index_value(self, index, action, value):
+        # item() and scalar stores keep this on Python floats: indexing NumPy scalars costs
+        # more than the rest of the update
+        array = self.array
+        old = array.item(index, action)
+        array[index, action] = value
+        best = self.max_values.item(index)
+        if value > best:
+            self.max_values[index] = value
+            self.greedy[index] = action
+            self.num_greedy[index] = 1
+        elif value == best:
+            if old != best:
+                self.num_greedy[index] += 1
+        elif old == best:
+            # a greedy action lost value
+            # a plain loop beats NumPy calls on a handful of actions
+            row = array[index].tolist()
+            if self.num_greedy[index] == 1:
+                best = max(row)
+                self.max_values[index] = best
+                self.greedy[index] = row.index(best)
+                self.num_greedy[index] = row.count(best)
+            else:
+                self.num_greedy[index] -= 1
+                if self.greedy[index] == action:
+                    self.greedy[index] = row.index(best)
+
+    def greedy_index_at(self, index, break_ties=True):
+        """
+        Returns the index of a greedy action of row index: uniformly at random among
+        ties when break_ties is set, and the first one otherwise.
+        """
+        num_greedy = self.num_greedy[index]
+        if num_greedy == 1:
+            return int(self.greedy[index])
+        # the k-th greedy action; a plain loop beats NumPy calls on a handful of actions
+        k = randrange(num_greedy) if break_ties else 0
+        best = self.max_values[index].item()
+        for action, value in enumerate(self.array[index].tolist()):
+            if value == best:
+                if k == 0:
+                    return action
+                k -= 1
+
+    def refresh_rows(self, rows):
+        """
+        Rebuilds the greedy cache of the given rows.
+        """
+        values = self.array[rows]
+        best = values.max(axis=1)
+        is_max = values == best[:, None]
+        self.max_values[rows] = best
+        self.greedy[rows] = is_max.argmax(axis=1)
+        self.num_greedy[rows] = is_max.sum(axis=1)
+
+    def update_batch(self, states, actions, next_states, rewards, learning_rate, decrease_rate, discount_rate):
+        """
+        Applies the (hysteretic) Q-learning rule to a batch of transitions given as row and
+        action indices, with exactly the result of applying them one at a time in order:
+            delta = reward + discount_rate * max(next state's values) - value
+            value += delta * (learning_rate if delta >= 0 else decrease_rate)
+        decrease_rate == learning_rate is plain Q-learning. Returns the deltas.
+
+        Transitions are applied in vectorized passes of transitions that don't depend on each
+        other. Without discounting, a transition only depends on earlier ones with the same
+        (state, action), so pass k holds the k-th occurrence of every pair. With discounting it
+        also depends on earlier writes to its next state's row, and passes are runs of
+        consecutive transitions free of such conflicts. When the passes would be too small to
+        pay for their NumPy calls (e.g. a one-state game), a plain loop is used instead.
+        """
+        states = np.asarray(states, dtype=np.intp)
+        actions = np.asarray(actions, dtype=np.intp)
+        next_states = np.asarray(next_states, dtype=np.intp)
+        rewards = np.asarray(rewards, dtype=float)
+        n = len(states)
+        cells = states * self.array.shape[1] + actions
+        if discount_rate == 0:
+            passes = _occurrence_passes(cells)
+        else:
+            passes = _conflict_free_runs(cells, states, next_states)
+        if len(passes) * MIN_PASS_SIZE > n:
+            return self._update_loop(states, actions, next_states, rewards, learning_rate, decrease_rate, discount_rate)
+
+        deltas = np.empty(n)
+        array, max_values = self.array, self.max_values
+        for batch in passes:
+            s, a = states[batch], actions[batch]
+            old = array[s, a]
+            delta = rewards[batch] + discount_rate * max_values[next_states[batch]] - old
+            array[s, a] = old + delta * np.where(delta >= 0, learning_rate, decrease_rate)
+            deltas[batch] = delta
+            self.refresh_rows(np.unique(s))
+        return deltas
+
+    def _update_loop(self, states, actions, next_states, rewards, learning_rate, decrease_rate, discount_rate):
+        array, max_values = self.array, self.max_values
+        deltas = []
+        for s, a, s2, reward in zip(states.tolist(), actions.tolist(), next_states.tolist(), rewards.tolist()):
+            old = array[s, a]
+            delta = reward + discount_rate * max_values[s2] - old
+            self.set_index_value(s, a, old + delta * (learning_rate if delta >= 0 else decrease_rate))
+            deltas.append(delta)
+        return np.array(deltas, dtype=float)
+
+    # Mapping interface: the dict-of-dicts view
+    def __getitem__(self, state):
+        return QRow(self, self.index_of(state))
+
+    def __iter__(self):
+        return iter(self.states)
+
+    def __len__(self):
+        return len(self.states)
+
+    def __contains__(self, state):
+        return state in self.state_index
+
+    def __repr__(self):
+        return "QTable({} states x {} actions)".format(*self.array.shape)
+
+
+class LazyQTable(QTable):
+    """
+    QTable whose rows are created the first time a state is touched, so construction is
+    O(1) and memory grows with the number of states visited. New rows hold initial_value.
+    """
+
+    def __init__(self, actions, initial_value=0, dtype=np.float64, capacity=64):
+        self.states = []
+        self.actions = list(actions)
+        self.state_index = {}
+        self.action_index = {action: i for i, action in enumerate(self.actions)}
+        self.initial_value = initial_value
+        self.array = np.full((capacity, len(self.actions)), initial_value, dtype=dtype)
+        self.refresh()
+
+    @classmethod
+    def for_environment(cls, environment, initial_value=0):
+        action_space = environment.get_action_space()
+        if(callable(action_space)):
+            raise ValueError("A dense QTable needs a fixed action space")
+        return cls(action_space, initial_value)
+
+    @classmethod
+    def from_array(cls, states, actions, array, initial_value=0):
+        table = super().from_array(states, actions, array)
+        table.initial_value = initial_value
+        return table
+
+    def index_of(self, state):
+        index = self.state_index.get(state)
+        if index is None:
+            index = len(self.states)
+            if index == len(self.array):
+                self._grow()
+            self.state_index[state] = index
+            self.states.append(state)
+        return index
+
+    def _grow(self):
+        used = len(self.array)
+        # a table loaded from an empty checkpoint has no rows to double
+        array = np.full((max(1, 2 * used), len(self.actions)), self.initial_value, dtype=self.array.dtype)
+        array[:used] = self.array
+        max_values, greedy, num_greedy = self.max_values, self.greedy, self.num_greedy
+        self.array = array
+        self.refresh()
+        self.max_values[:used] = max_values
+        self.greedy[:used] = greedy
+        self.num_greedy[:used] = num_greedy
+
+
+class EncodedQTable(QTable):
+    """
+    QTable addressed directly by integer state and action codes
+    (see Environment.encode_state), so no index lookups are needed.
+    """
+
+    def __init__(self, num_states, num_actions, initial_value=0, dtype=np.float64):
+        self.states = range(num_states)
+        self.actions = list(range(num_actions))
+        self.action_index = {action: action for action in self.actions}
+        self.array = np.full((num_states, num_actions), initial_value, dtype=dtype)
+        self.refresh()
+
+    @classmethod
+    def for_environment(cls, environment, initial_value=0):
+        return cls(environment.num_states, environment.num_actions, initial_value)
+
+    @classmethod
+    def from_array(cls, array):
+        table = cls.__new__(cls)
+        table.states = range(array.shape[0])
+        table.actions = list(range(array.shape[1]))
+        table.action_index = {action: action for action in table.actions}
+        table.array = array
+        table.refresh()
+        return table
+
+    def index_of(self, state):
+        return state
+
+    def indices_of(self, states):
+        return np.asarray(states, dtype=np.intp)
+
+    def action_indices_of(self, actions):
+        return np.asarray(actions, dtype=np.intp)
+
+    def row(self, state):
+        return self.array[state]
+
+    def get_value(self, state, action):
+        return self.array.item(state, action)
+
+    def set_value(self, state, action, value):
+        self.set_index_value(state, action, value)
+
+    def max_value(self, state):
+        return self.max_values.item(state)
+
+    def greedy_index(self, state, break_ties=True):
+        return self.greedy_index_at(state, break_ties)
+
+    def __getitem__(self, state):
+        if not 0 <= state < len(self.states):
+            raise KeyError(state)
+        return QRow(self, state)
+
+    def __contains__(self, state):
+        return state in self.states
+
+
+class LazyQValues(dict):
+    """
+    Dict-of-dicts q_values that creates a state's {action: value} entry the first time
+    the state is looked up. action_space is a list, or a callable taking the state.
+    """
+
+    def __init__(self, action_space, initial_value=0):
+        dict.__init__(self)
+        self.action_space = action_space
+        self.initial_value = initial_value
+
+    def __missing__(self, state):
+        actions = self.action_space(state) if callable(self.action_space) else self.action_space
+        values = {action: self.initial_value for action in actions}
+        self[state] = values
+        return values
+
+
+def make_q_table(environment, encoded=False, lazy=False, initial_value=0):
+    """
+    Returns the dense table a learner should use for environment.
+    """
+    if(encoded):
+        return EncodedQTable.for_environment(environment, initial_value)
+    if(lazy):
+        return LazyQTable.for_environment(environment, initial_value)
+    return QTable.for_environment(environment, initial_value)
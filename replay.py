@@ -0,0 +1,164 @@
+"""
+Experience replay: a preallocated buffer of transitions, and offline training over it.
+
+Transitions are stored as integer codes (see Environment.encode_state), one row per step:
+the state, the joint action (one action code per agent), the shared reward, the next state
+and whether the next state ended the episode. When the buffer is full the oldest rows are
+overwritten.
+
+The buffer fills from
+    - simulate_task(..., replay=buffer), one step at a time;
+    - simulate_batch(..., replay=buffer), every trial of every step;
+    - collect_predator_experience, which runs many Predator2 episodes at once with the
+      vectorized kernel of predator_kernel.py;
+and train_offline sweeps learners over it with their vectorized update_batch, so expensive
+experience can be replayed many times.
+"""
+import numpy as np
+
+
+class ReplayBuffer:
+    """
+    capacity: the number of transitions kept.
+    environment: when given, add encodes states and actions with it; otherwise they must
+    already be codes (as in simulate_task(..., encoded=True)).
+    """
+
+    def __init__(self, capacity, num_agents=2, environment=None):
+        self.capacity = capacity
+        self.num_agents = num_agents
+        self.environment = environment
+        self.states = np.zeros(capacity, dtype=np.int64)
+        self.actions = np.zeros((capacity, num_agents), dtype=np.int32)
+        self.rewards = np.zeros(capacity, dtype=np.float64)
+        self.next_states = np.zeros(capacity, dtype=np.int64)
+        self.terminal = np.zeros(capacity, dtype=np.bool_)
+        self.count = 0
+
+    def __len__(self):
+        return min(self.count, self.capacity)
+
+    def add(self, state, actions, reward, next_state, terminal):
+        environment = self.environment
+        if environment is not None:
+            state = environment.encode_state(state)
+            next_state = environment.encode_state(next_state)
+            actions = [environment.encode_action(action) for action in actions]
+        i = self.count % self.capacity
+        self.states[i] = state
+        self.actions[i] = actions
+        self.rewards[i] = reward
+        self.next_states[i] = next_state
+        self.terminal[i] = terminal
+        self.count += 1
+
+    def add_batch(self, states, actions, rewards, next_states, terminal):
+        """
+        Adds many transitions at once; all arguments are arrays of codes, actions of shape
+        (n, num_agents).
+        """
+        n = len(states)
+        if n > self.capacity:
+            # only the last capacity transitions would survive
+            states, actions, rewards, next_states, terminal = (
+                np.asarray(x)[n - self.capacity:] for x in (states, actions, rewards, next_states, terminal))
+            self.count += n - self.capacity
+            n = self.capacity
+        rows = (self.count + np.arange(n)) % self.capacity
+        self.states[rows] = states
+        self.actions[rows] = actions
+        self.rewards[rows] = rewards
+        self.next_states[rows] = next_states
+        self.terminal[rows] = terminal
+        self.count += n
+
+    def _rows(self):
+        # the stored rows, oldest first
+        if self.count <= self.capacity:
+            return slice(0, self.count)
+        start = self.count % self.capacity
+        return np.r_[start:self.capacity, 0:start]
+
+    def transitions(self, rows=None):
+        """
+        Returns (states, actions, rewards, next_states, terminal) arrays for rows (indices into
+        the chronological order), or for every stored transition, oldest first.
+        """
+        order = self._rows()
+        if rows is not None:
+            order = np.arange(self.capacity)[order][rows]
+        return self.states[order], self.actions[order], self.rewards[order], self.next_states[order], self.terminal[order]
+
+    def sample(self, batch_size, rng=None):
+        """
+        batch_size transitions drawn uniformly with replacement. rng is a numpy Generator.
+        """
+        rng = np.random.default_rng(rng)
+        return self.transitions(rng.integers(0, len(self), size=batch_size))
+
+    def save(self, path):
+        states, actions, rewards, next_states, terminal = self.transitions()
+        np.savez(path, states=states, actions=actions, rewards=rewards, next_states=next_states, terminal=terminal)
+
+    @classmethod
+    def load(cls, path, capacity=None, environment=None):
+        with np.load(path) as data:
+            n = len(data["states"])
+            buffer = cls(capacity or n, data["actions"].shape[1], environment)
+            buffer.add_batch(data["states"], data["actions"], data["rewards"], data["next_states"], data["terminal"])
+        return buffer
+
+
+def _learner_inputs(learner, states, actions, next_states):
+    # decodes the stored codes unless the learner works on codes itself
+    if getattr(learner, "encoded", False):
+        return states, actions, next_states
+    environment = learner.environment
+    decode_state = environment.decode_state
+    decode_action = environment.decode_action
+    return ([decode_state(code) for code in states.tolist()], [decode_action(code) for code in actions.tolist()],
+            [decode_state(code) for code in next_states.tolist()])
+
+
+def train_offline(learners, buffer, epochs=1, batch_size=None, shuffle=False, t=None, rng=None):
+    """
+    Sweeps learners over the transitions of buffer: learners[k] learns from the actions of
+    agent k. Each epoch goes through the buffer in order (or in a random order with shuffle),
+    batch_size transitions at a time (all of them by default), with update_batch, so every
+    batch gives exactly the Q-values of updating on its transitions one by one.
+    t is passed to the learners' rate schedules. An empty buffer trains nothing.
+    """
+    n = len(buffer)
+    if n == 0:
+        return
+    rng = np.random.default_rng(rng)
+    batch_size = batch_size or n
+    for _ in range(epochs):
+        order = rng.permutation(n) if shuffle else np.arange(n)
+        for start in range(0, n, batch_size):
+            states, actions, rewards, next_states, _ = buffer.transitions(order[start:start + batch_size])
+            for k, learner in enumerate(learners):
+                learner_states, learner_actions, learner_next_states = _learner_inputs(
+                    learner, states, actions[:, k], next_states)
+                learner.update_batch(learner_states, learner_actions, learner_next_states, rewards, t)
+
+
+def collect_predator_experience(buffer, num_episodes, steps, rng=None, policy=None):
+    """
+    Runs num_episodes Predator2 episodes side by side for steps steps with the vectorized
+    kernel and adds every transition to buffer, which must hold codes (no environment).
+    policy maps an array of state codes to (num_episodes, 2) action codes; by default both
+    predators act uniformly at random.
+    """
+    from predator_kernel import PredatorBatch
+
+    rng = np.random.default_rng(rng)
+    batch = PredatorBatch(num_episodes, rng)
+    states = batch.get_states()
+    for _ in range(steps):
+        actions = rng.integers(0, 5, size=(num_episodes, 2)) if policy is None else policy(states)
+        rewards, next_states, terminal = batch.step(actions)
+        buffer.add_batch(states, actions, rewards, next_states, terminal)
+        # terminal episodes have restarted from a fresh state
+        states = batch.get_states()
+    return buffer
@@ -0,0 +1,201 @@
+"""
+A local cache of finished trials, so rerunning an experiment only runs what changed.
+
+A trial's result is stored under the hash of
+    - its description: trial.describe(), a JSON-able dict of everything that determines the
+      result (environment and agent configuration, policy, schedules, timesteps);
+    - its seed;
+    - the code version: a hash of the package's source files, so editing a learner, an
+      environment or a policy invalidates every result computed with the old code.
+Trials without a describe method, or whose describe returns None or raises ValueError, are
+never cached.
+
+Results are stored one file per trial, as compressed .npz files under
+<path>/<first two hex digits of the key>/<key>.npz (reward curves are mostly zeros and
+compress well). Reading a result refreshes its modification time, and when the store grows
+beyond max_bytes the least recently used results are evicted.
+
+runner.iter_jobs(jobs, workers, store=store) (and everything built on it: run_trials,
+run_experiments, aggregate_trials, sweep.sweep, experiment.py) takes its results from the
+store when it has them and only runs the other trials.
+"""
+import functools
+import glob
+import hashlib
+import inspect
+import json
+import os
+import sys
+
+import numpy as np
+
+from atomic import replace_file
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+_code_version = None
+
+
+def code_version():
+    """
+    Hash of the package's top-level source files.
+    """
+    global _code_version
+    if _code_version is None:
+        digest = hashlib.sha256()
+        for path in sorted(glob.glob(os.path.join(ROOT, "*.py"))):
+            digest.update(os.path.basename(path).encode())
+            with open(path, "rb") as f:
+                digest.update(f.read())
+        _code_version = digest.hexdigest()
+    return _code_version
+
+
+def _package_name(value):
+    # classes and functions are described by name; their code is in the code version only if
+    # they are defined at the top level of one of the package's modules
+    module = sys.modules.get(value.__module__)
+    path = getattr(module, "__file__", None)
+    if "<" in value.__qualname__ or path is None or os.path.dirname(os.path.abspath(path)) != ROOT:
+        raise ValueError("{!r} cannot be described".format(value))
+    return "{}.{}".format(value.__module__, value.__qualname__)
+
+
+def describe(value):
+    """
+    A JSON-able description of value, for trial descriptions: its describe() if it has one
+    (e.g. environments), numbers and strings as they are, arrays by a hash of their contents,
+    package classes and functions by name, bound methods by name and instance,
+    functools.partial by its parts and anything else by its repr (e.g. schedules).
+    Raises ValueError for what cannot be described reliably: lambdas, closures, code outside
+    the package and objects whose repr is their address or is abbreviated (NumPy shortens
+    large arrays with "...").
+    """
+    if value is None or isinstance(value, (bool, int, float, str)):
+        return value
+    if isinstance(value, (np.integer, np.floating)):
+        return value.item()
+    if isinstance(value, np.ndarray):
+        digest = hashlib.sha256(np.ascontiguousarray(value).tobytes()).hexdigest()
+        return {"array": digest, "dtype": str(value.dtype), "shape": list(value.shape)}
+    if isinstance(value, (list, tuple)):
+        return [describe(item) for item in value]
+    if isinstance(value, dict):
+        return {str(key): describe(item) for key, item in value.items()}
+    if isinstance(value, functools.partial):
+        return {"partial": describe(value.func), "args": describe(value.args), "keywords": describe(value.keywords)}
+    if inspect.ismethod(value):
+        # the method's result depends on its instance
+        return {"method": _package_name(value.__func__), "self": describe(value.__self__)}
+    if isinstance(value, type) or inspect.isroutine(value):
+        return _package_name(value)
+    if hasattr(value, "describe"):
+        return describe(value.describe())
+    text = repr(value)
+    if " at 0x" in text or "..." in text:
+        raise ValueError("{} cannot be described".format(text))
+    return text
+
+
+def trial_key(description, seed):
+    payload = json.dumps({"trial": description, "seed": seed, "code": code_version()}, sort_keys=True)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+class ResultStore:
+    def __init__(self, path, max_bytes=2 ** 30):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._size = None
+
+    def key(self, trial, seed):
+        """
+        The key of trial run with seed, or None if trial cannot be cached.
+        """
+        describe_trial = getattr(trial, "describe", None)
+        if describe_trial is None:
+            return None
+        try:
+            description = describe_trial()
+        except ValueError:
+            return None
+        if description is None:
+            return None
+        return trial_key(description, seed)
+
+    def _file(self, key):
+        return os.path.join(self.path, key[:2], key + ".npz")
+
+    def get(self, key):
+        """
+        The stored result of key, or None.
+        """
+        path = self._file(key)
+        try:
+            with np.load(path) as data:
+                result = data["result"]
+        except (OSError, KeyError, ValueError):
+            self.misses += 1
+            return None
+        # reading counts as a use for the eviction order
+        os.utime(path)
+        self.hits += 1
+        return result
+
+    def put(self, key, result):
+        path = self._file(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        try:
+            # an overwritten result no longer counts towards the size
+            old_size = os.path.getsize(path)
+        except OSError:
+            old_size = 0
+        replace_file(path, lambda f: np.savez_compressed(f, result=np.asarray(result)))
+        if self._size is not None:
+            self._size += os.path.getsize(path) - old_size
+        if self.size() > self.max_bytes:
+            self.evict()
+
+    def _entries(self):
+        entries = []
+        for path in glob.glob(os.path.join(self.path, "*", "*.npz")):
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+        return entries
+
+    def size(self):
+        """
+        Bytes held by the store (scanned once, then kept up to date by put).
+        """
+        if self._size is None:
+            self._size = sum(size for _, size, _ in self._entries())
+        return self._size
+
+    def __len__(self):
+        return len(self._entries())
+
+    def evict(self, max_bytes=None):
+        """
+        Removes the least recently used results until the store holds at most max_bytes
+        (by default, 90% of the store's max_bytes, so eviction doesn't run on every put).
+        """
+        if max_bytes is None:
+            max_bytes = int(self.max_bytes * 0.9)
+        entries = sorted(self._entries())
+        size = sum(size for _, size, _ in entries)
+        for _, file_size, path in entries:
+            if size <= max_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            size -= file_size
+        self._size = size
+
+    def clear(self):
+        self.evict(0)
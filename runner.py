@@ -0,0 +1,167 @@
+"""
+Runs independent trials of an experiment across a process pool.
+
+Each trial gets its own seed, derived from one experiment seed with numpy's SeedSequence.
+Before a trial runs, the global `random` and `np.random` generators (used by the policies and
+the environments) are seeded with it. A trial's result therefore depends only on its own
+seed, and results are identical whatever the number of workers.
+
+Trials are callables taking that seed and returning a row of results (e.g. the reward per
+timestep). They are sent to the workers with pickle, so they and everything they reference
+must be importable: module-level functions, classes like SimulationTrial, functools.partial.
+
+Every runner takes an optional store, a result_store.ResultStore: trials that can describe
+themselves (see SimulationTrial.describe) are then only run if the store doesn't hold their
+result for that seed yet.
+"""
+import os
+import random
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from utils import simulate_task
+
+
+def trial_seeds(seed, num_trials):
+    """
+    Returns num_trials independent integer seeds derived from seed.
+    """
+    children = np.random.SeedSequence(seed).spawn(num_trials)
+    return [int(child.generate_state(1, np.uint64)[0]) for child in children]
+
+
+def seed_globals(seed):
+    random.seed(seed)
+    np.random.seed(seed % 2**32)
+
+
+def _run_trial(job):
+    trial, seed = job
+    seed_globals(seed)
+    return np.asarray(trial(seed))
+
+
+def iter_jobs(jobs, workers=None, store=None):
+    """
+    jobs: a list of (trial, seed) pairs. Yields their results in the same order, as they
+    complete.
+    workers: number of processes; 1 runs everything in this process. Defaults to the CPU count.
+    store: a result_store.ResultStore results are taken from when it has them, and saved to.
+    """
+    if store is None:
+        yield from _iter_jobs(jobs, workers)
+        return
+    keys = [store.key(trial, seed) for trial, seed in jobs]
+    cached = [store.get(key) if key is not None else None for key in keys]
+    missing = [i for i, result in enumerate(cached) if result is None]
+    results = _iter_jobs([jobs[i] for i in missing], workers)
+    for key, result in zip(keys, cached):
+        if result is None:
+            result = next(results)
+            if key is not None:
+                store.put(key, result)
+        yield result
+
+
+def _iter_jobs(jobs, workers):
+    if workers is None:
+        workers = os.cpu_count() or 1
+    workers = min(workers, len(jobs)) if jobs else 1
+    if workers == 1:
+        for job in jobs:
+            yield _run_trial(job)
+        return
+    chunksize = max(1, len(jobs) // (workers * 4))
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        yield from executor.map(_run_trial, jobs, chunksize=chunksize)
+
+
+def run_jobs(jobs, workers=None, store=None):
+    """
+    Returns the results of jobs (see iter_jobs) as a list.
+    """
+    return list(iter_jobs(jobs, workers, store))
+
+
+def run_trials(trial, num_trials, seed=None, workers=None, store=None):
+    """
+    Runs trial num_trials times, each with its own seed, and returns the stacked
+    (num_trials, ...) array of results.
+    """
+    jobs = [(trial, s) for s in trial_seeds(seed, num_trials)]
+    return np.stack(run_jobs(jobs, workers, store))
+
+
+def aggregate_trials(trial, num_trials, timesteps, seed=None, workers=None, store=None):
+    """
+    Like run_trials, but folds each (timesteps,) result row into a metrics.PerStepAggregate as
+    it arrives instead of stacking them, so only the running mean and median are kept.
+    """
+    from metrics import PerStepAggregate
+
+    aggregate = PerStepAggregate(timesteps)
+    for row in iter_jobs([(trial, s) for s in trial_seeds(seed, num_trials)], workers, store):
+        aggregate.add_trial(row)
+    return aggregate
+
+
+def run_experiments(trials, num_trials, seed=None, workers=None, store=None):
+    """
+    trials: a dict of name -> trial, e.g. one per value of k or learning rate.
+    All trials of all experiments share one process pool. Trial i of every experiment gets
+    the same seed, so the experiments are compared on common random numbers.
+    Returns a dict of name -> (num_trials, ...) array.
+    """
+    seeds = trial_seeds(seed, num_trials)
+    names = list(trials)
+    jobs = [(trials[name], s) for name in names for s in seeds]
+    results = run_jobs(jobs, workers, store)
+    return {name: np.stack(results[i * num_trials:(i + 1) * num_trials]) for i, name in enumerate(names)}
+
+
+class SimulationTrial:
+    """
+    One trial of the notebook experiments: builds a fresh task and agents, runs simulate_task
+    until timesteps have elapsed, and records agents[0].accumulated_reward at the end of
+    every episode.
+
+    make_task: callable returning the environment, e.g. functools.partial(PenaltyGame, -100).
+    make_agents: callable taking the environment and returning the list of agents.
+    """
+
+    def __init__(self, make_task, make_agents, timesteps, system_temperature=None):
+        self.make_task = make_task
+        self.make_agents = make_agents
+        self.timesteps = timesteps
+        self.system_temperature = system_temperature
+
+    def describe(self):
+        """
+        What determines the trial's results, for result_store.ResultStore. Raises ValueError
+        if make_task or make_agents cannot be described (e.g. lambdas).
+        """
+        from result_store import describe
+
+        return {
+            "trial": describe(type(self)),
+            "task": describe(self.make_task),
+            "agents": describe(self.make_agents),
+            "timesteps": self.timesteps,
+            "system_temperature": describe(self.system_temperature),
+        }
+
+    def __call__(self, seed=None):
+        task = self.make_task()
+        agents = self.make_agents(task)
+        rewards = np.zeros(self.timesteps)
+
+        T = self.system_temperature
+        t = 0
+        while(t < self.timesteps):
+            # simulate_task starts every episode from the start state; so must the task
+            task.reset_state()
+            t, T = simulate_task(agents, task, t, T, timesteps=self.timesteps)
+            rewards[t - 1] = agents[0].accumulated_reward
+            agents[0].accumulated_reward = 0
+        return rewards
@@ -0,0 +1,209 @@
+"""
+Rate and temperature schedules.
+
+A schedule is a callable of the timestep t, so it can be passed anywhere the learners take a
+get_*_rate callable (or epsilon_greedy an exploration rate). Unlike a lambda it can also
+    - give all its values at once: schedule.array(n) is the values for t = 0 .. n-1, which the
+      batched runners index instead of calling the schedule every step;
+    - say it is constant: schedule.constant is its value if it never changes and None
+      otherwise, so the learners and policies read the value once instead of calling it;
+    - be precomputed: schedule.compile(n) returns an equivalent schedule that looks its first n
+      values up in a list.
+
+simulate_task passes the timestep to the learners and policies; called without one (t=None),
+a schedule gives its value at t = 0.
+
+NumPy is only imported by the methods returning arrays, so the learners and policies, which
+import this module, do not pay for it.
+"""
+
+
+class Schedule:
+    constant = None
+
+    def value(self, t):
+        raise NotImplementedError()
+
+    def __call__(self, t=None):
+        return self.value(0 if t is None else t)
+
+    def array(self, n):
+        import numpy as np
+        return np.array([self.value(t) for t in range(n)], dtype=float)
+
+    def compile(self, n):
+        if self.constant is not None:
+            return self
+        return CompiledSchedule(self, n)
+
+
+class Constant(Schedule):
+    def __init__(self, value):
+        self.constant = value
+
+    def value(self, t):
+        return self.constant
+
+    def __call__(self, t=None):
+        return self.constant
+
+    def array(self, n):
+        import numpy as np
+        return np.full(n, self.constant, dtype=float)
+
+    def __repr__(self):
+        return "Constant({})".format(self.constant)
+
+
+class Exponential(Schedule):
+    """
+    initial * decay**t, but never below minimum. Exponential(T, 0.99) is the system temperature
+    decay simulate_task applies by default.
+    """
+
+    def __init__(self, initial, decay, minimum=0.0):
+        self.initial = initial
+        self.decay = decay
+        self.minimum = minimum
+        if decay == 1:
+            self.constant = max(initial, minimum)
+
+    def value(self, t):
+        return max(self.initial * self.decay ** t, self.minimum)
+
+    def array(self, n):
+        import numpy as np
+        return np.maximum(self.initial * self.decay ** np.arange(n, dtype=float), self.minimum)
+
+    def __repr__(self):
+        return "Exponential({}, {}, minimum={})".format(self.initial, self.decay, self.minimum)
+
+
+class Linear(Schedule):
+    """
+    Goes linearly from start to end over duration steps, then stays at end.
+    """
+
+    def __init__(self, start, end, duration):
+        self.start = start
+        self.end = end
+        self.duration = duration
+        if start == end:
+            self.constant = start
+
+    def value(self, t):
+        if t >= self.duration:
+            return self.end
+        return self.start + (self.end - self.start) * t / self.duration
+
+    def array(self, n):
+        import numpy as np
+        fraction = np.minimum(np.arange(n, dtype=float) / self.duration, 1.0)
+        return self.start + (self.end - self.start) * fraction
+
+    def __repr__(self):
+        return "Linear({}, {}, {})".format(self.start, self.end, self.duration)
+
+
+class Inverse(Schedule):
+    """
+    scale / (t + offset), e.g. the 1/t learning and exploration rates of the GridWorld notebooks:
+    they count t from 1, so the default offset of 1 gives the same rates with t counted from 0.
+    """
+
+    def __init__(self, scale=1.0, offset=1.0):
+        if offset <= 0:
+            raise ValueError("The offset of an Inverse schedule must be positive, got {}".format(offset))
+        self.scale = scale
+        self.offset = offset
+
+    def value(self, t):
+        return self.scale / (t + self.offset)
+
+    def array(self, n):
+        import numpy as np
+        return self.scale / (np.arange(n, dtype=float) + self.offset)
+
+    def __repr__(self):
+        return "Inverse({}, offset={})".format(self.scale, self.offset)
+
+
+class Piecewise(Schedule):
+    """
+    Piecewise([(0, Constant(0.5)), (1000, Exponential(0.5, 0.999))]) follows each schedule from
+    its start timestep until the next one starts. Each piece sees t counted from its own start.
+    """
+
+    def __init__(self, pieces):
+        self.pieces = sorted(pieces, key=lambda piece: piece[0])
+        if not self.pieces or self.pieces[0][0] != 0:
+            raise ValueError("The first piece of a Piecewise schedule must start at t = 0")
+        self.starts = [start for start, _ in self.pieces]
+        values = {piece.constant for _, piece in self.pieces}
+        if len(values) == 1 and None not in values:
+            self.constant = values.pop()
+
+    def value(self, t):
+        i = 0
+        while i + 1 < len(self.starts) and self.starts[i + 1] <= t:
+            i += 1
+        start, piece = self.pieces[i]
+        return piece.value(t - start)
+
+    def array(self, n):
+        import numpy as np
+        values = np.empty(n)
+        for i, (start, piece) in enumerate(self.pieces):
+            if start >= n:
+                break
+            end = self.starts[i + 1] if i + 1 < len(self.starts) else n
+            end = min(end, n)
+            values[start:end] = piece.array(end - start)
+        return values
+
+    def __repr__(self):
+        return "Piecewise({!r})".format(self.pieces)
+
+
+class CompiledSchedule(Schedule):
+    """
+    schedule with its first n values precomputed; later timesteps fall back to schedule.
+    """
+
+    def __init__(self, schedule, n):
+        self.schedule = schedule
+        self.values = schedule.array(n).tolist()
+        self.constant = schedule.constant
+
+    def value(self, t):
+        if 0 <= t < len(self.values):
+            return self.values[t]
+        return self.schedule.value(t)
+
+    def array(self, n):
+        import numpy as np
+        if n <= len(self.values):
+            return np.array(self.values[:n])
+        return self.schedule.array(n)
+
+
+def as_array(rate, n):
+    """
+    Returns the values of rate for t = 0 .. n-1: rate is a number, a Schedule or any callable of t.
+    """
+    import numpy as np
+
+    if isinstance(rate, Schedule):
+        return rate.array(n)
+    if callable(rate):
+        return np.array([rate(t) for t in range(n)], dtype=float)
+    return np.full(n, rate, dtype=float)
+
+
+def constant_value(rate):
+    """
+    The value of rate if it is a number or a constant schedule, None otherwise.
+    """
+    if not callable(rate):
+        return rate
+    return getattr(rate, "constant", None)
@@ -0,0 +1,193 @@
+"""
+Q-tables in shared memory, readable and writable from several processes without pickling.
+
+A SharedQStore holds num_tables Q-tables of the same shape in one
+multiprocessing.shared_memory block, laid out as
+    version: one int64, bumped around publish() (see below);
+    owners:  (num_tables,) int64, the pid of the process allowed to write each table (0: none);
+    values:  (num_tables, num_states, num_actions) float64.
+
+Ownership: each table has at most one writer. A process becomes a table's writer with
+table(k, writable=True) or attach(agent, k), which fails if another live process owns it, and
+stops being one with release(k). Claims and releases hold the store's lock, a
+multiprocessing.Lock created with the store, so two processes cannot both claim a table.
+Every other process, including the parent, sees read-only views: it can inspect or aggregate
+values (e.g. store.values.mean(axis=0)) in place while the writers run, without locks, at the
+cost of possibly reading a row mid-update. The store never copies values between processes;
+pass the store itself to workers. It pickles as its name, plus its lock when passed to a new
+multiprocessing.Process; a store reaching a process otherwise (e.g. through a pool) or opened
+by name can read the tables but not claim them.
+
+For consistent copies of all the tables, a single writer can publish() them and readers
+read() them: version is odd while publish writes, and read retries until it copied the values
+under one even version.
+"""
+import multiprocessing
+import os
+import time
+from multiprocessing.context import get_spawning_popen
+from multiprocessing.shared_memory import SharedMemory
+
+import numpy as np
+
+from qtable import EncodedQTable, QTable
+
+
+def _alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+class SharedQStore:
+    """
+    SharedQStore(num_tables, num_states, num_actions) creates a new store in the calling
+    process, which owns the shared memory and must close(unlink=True) it when done
+    (or use it as a context manager). SharedQStore.open(name, shape, lock) attaches to an
+    existing one; unpickling a store does the same. context: the multiprocessing context of the
+    processes the store is passed to (default: the default context), which creates its lock.
+    """
+
+    def __init__(self, num_tables, num_states, num_actions, initial_value=0.0, name=None, lock=None, context=None):
+        self.shape = (num_tables, num_states, num_actions)
+        self.creator = name is None
+        if self.creator:
+            lock = (context or multiprocessing).Lock()
+        self.lock = lock
+        size = 8 * (1 + num_tables + num_tables * num_states * num_actions)
+        self.memory = SharedMemory(name=name, create=self.creator, size=size if self.creator else 0)
+        buffer = self.memory.buf
+        self._version = np.ndarray((1,), dtype=np.int64, buffer=buffer)
+        self.owners = np.ndarray((num_tables,), dtype=np.int64, buffer=buffer, offset=8)
+        self._values = np.ndarray(self.shape, dtype=np.float64, buffer=buffer, offset=8 * (1 + num_tables))
+        if self.creator:
+            self._version[0] = 0
+            self.owners[:] = 0
+            self._values[...] = initial_value
+        # other processes only ever see the values read-only
+        self.values = self._values.view()
+        self.values.flags.writeable = False
+
+    @classmethod
+    def for_environment(cls, environment, num_tables, initial_value=0.0, context=None):
+        return cls(num_tables, environment.num_states, environment.num_actions, initial_value, context=context)
+
+    @classmethod
+    def open(cls, name, shape, lock=None):
+        return cls(*shape, name=name, lock=lock)
+
+    @property
+    def name(self):
+        return self.memory.name
+
+    def __len__(self):
+        return self.shape[0]
+
+    def __reduce__(self):
+        # a lock can only be pickled for a process being started
+        lock = self.lock if get_spawning_popen() is not None else None
+        return (SharedQStore.open, (self.name, self.shape, lock))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close(unlink=self.creator)
+
+    # Ownership
+    def claim(self, k):
+        if self.lock is None:
+            raise RuntimeError("Store {} was opened without its lock and cannot claim tables".format(self.name))
+        pid = os.getpid()
+        with self.lock:
+            owner = int(self.owners[k])
+            if owner not in (0, pid) and _alive(owner):
+                raise RuntimeError("Table {} of {} is owned by process {}".format(k, self.name, owner))
+            self.owners[k] = pid
+
+    def release(self, k):
+        if self.lock is None:
+            return
+        with self.lock:
+            if int(self.owners[k]) == os.getpid():
+                self.owners[k] = 0
+
+    def table(self, k, writable=False, states=None, actions=None):
+        """
+        Returns table k as a QTable over the shared values: an EncodedQTable by default, or a
+        QTable over states and actions. writable claims the table for this process; otherwise
+        writing to it raises an error.
+        """
+        if writable:
+            self.claim(k)
+            array = self._values[k]
+        else:
+            array = self.values[k]
+        if states is None:
+            return EncodedQTable.from_array(array)
+        return QTable.from_array(states, actions, array)
+
+    def attach(self, agent, k, writable=True, copy_values=True):
+        """
+        Makes agent (a learner built with dense=True or encoded=True) use table k in place of
+        its own Q-table. With copy_values its current Q-values are copied into the table first.
+        """
+        own = agent.q_table
+        if own is None:
+            raise ValueError("Only learners with a dense Q-table can use a SharedQStore")
+        if own.array.shape != self.shape[1:]:
+            raise ValueError("The agent's table has shape {}, the store's {}".format(own.array.shape, self.shape[1:]))
+        if writable:
+            self.claim(k)
+            if copy_values:
+                self._values[k] = own.array
+        if isinstance(own, EncodedQTable):
+            table = self.table(k, writable)
+        else:
+            table = self.table(k, writable, own.states, own.actions)
+        agent.q_table = table
+        agent.q_values = table
+        return table
+
+    # Consistent snapshots
+    def publish(self, arrays):
+        """
+        Writes arrays into the tables as one consistent version. Only one process may publish.
+        """
+        self._version[0] += 1
+        for k, array in enumerate(arrays):
+            self._values[k] = array
+        self._version[0] += 1
+
+    @property
+    def version(self):
+        return int(self._version[0]) // 2
+
+    def read(self, out):
+        """
+        Copies all the tables into out, of shape self.shape, as published under one version,
+        and returns that version.
+        """
+        while True:
+            version = int(self._version[0])
+            if version % 2 == 0:
+                out[...] = self._values
+                if int(self._version[0]) == version:
+                    return version // 2
+            time.sleep(0)
+
+    def greedy_actions(self):
+        """
+        (num_tables, num_states) index of the first greedy action of every table, read in place.
+        """
+        return self.values.argmax(axis=2)
+
+    def close(self, unlink=False):
+        del self._version, self.owners, self._values, self.values
+        self.memory.close()
+        if unlink:
+            self.memory.unlink()
@@ -0,0 +1,210 @@
+"""
+Hyperparameter sweeps over hysteretic learners and environment parameters, with successive
+halving and a cache of finished trials.
+
+A configuration is a flat dict, e.g.
+    {"environment": "PenaltyGame", "k": -100, "learning_rate": 0.1, "decrease_rate": 0.01,
+     "temperature": 5000}
+where "environment" names a class of environment.py, the keys in LEARNER_DEFAULTS are the
+HystereticQLearner's rates and the initial system temperature, and every other key is passed
+to the environment's constructor. grid(...) builds the configurations of a full grid.
+
+sweep(configs, timesteps, num_trials) runs SweepTrial (the notebooks' simulation: two
+hysteretic learners with Boltzmann selection, reward recorded at the end of every episode)
+num_trials times per configuration, on the same seeds for every configuration, in one process
+pool (see runner.py). With eta, it halves instead: every configuration first runs for a
+fraction of timesteps, only the best 1/eta of them by score continue to eta times as many
+timesteps, and so on until the survivors run for the full timesteps.
+
+Each round reruns its configurations from t = 0 rather than continuing the previous round's
+runs: a trial's rewards are recorded at the end of each episode, and simulate_task starts
+every run from the start state, so a run stopped mid-episode cannot be continued exactly.
+The seeds are the same, so a longer run repeats the shorter one's steps before going further.
+Rerunning them costs a survivor at most eta / (eta - 1) times the steps continuing would,
+e.g. 1.5 times with eta = 3. SweepResult.steps counts every simulated step, reruns included.
+
+With a cache (a TrialCache, a result_store.ResultStore or its directory), every finished
+(configuration, seed, timesteps) reward row is kept, so an interrupted or extended sweep (more
+configurations, more trials) only runs what is missing.
+"""
+import math
+from itertools import product
+
+import numpy as np
+
+from runner import SimulationTrial, iter_jobs, trial_seeds
+
+LEARNER_DEFAULTS = {
+    "learning_rate": 0.1,
+    "decrease_rate": 0.01,
+    "discount_rate": 0.9,
+    "exploration_rate": 0.1,
+    "temperature": 5000,
+}
+
+
+def grid(**axes):
+    """
+    grid(environment="PenaltyGame", k=[-100, -10, 0], learning_rate=[0.1, 0.5]) returns the
+    configuration of every combination; values that are not lists are shared by all.
+    """
+    names = list(axes)
+    values = [axes[name] if isinstance(axes[name], list) else [axes[name]] for name in names]
+    return [dict(zip(names, combination)) for combination in product(*values)]
+
+
+def make_task(config):
+    import environment
+
+    kwargs = {name: value for name, value in config.items() if name != "environment" and name not in LEARNER_DEFAULTS}
+    return getattr(environment, config["environment"])(**kwargs)
+
+
+class MakeTask:
+    def __init__(self, config):
+        self.config = config
+
+    def __call__(self):
+        return make_task(self.config)
+
+    def describe(self):
+        return {"make_task": self.config}
+
+
+class MakeAgents:
+    def __init__(self, rates):
+        self.rates = rates
+
+    def __call__(self, task):
+        import boltzmann
+        from HystereticQLearner import HystereticQLearner
+        from schedules import Constant
+
+        rates = self.rates
+        return [HystereticQLearner(task, rates["exploration_rate"], Constant(rates["learning_rate"]),
+                                   Constant(rates["discount_rate"]), Constant(rates["decrease_rate"]),
+                                   boltzmann.selection, dense=True)
+                for _ in range(2)]
+
+    def describe(self):
+        return {"hysteretic_pair": self.rates}
+
+
+class SweepTrial(SimulationTrial):
+    """
+    The trial a configuration runs: a SimulationTrial of two hysteretic learners.
+    """
+
+    def __init__(self, config, timesteps):
+        rates = {name: config.get(name, default) for name, default in LEARNER_DEFAULTS.items()}
+        task_config = {name: value for name, value in config.items() if name not in LEARNER_DEFAULTS}
+        SimulationTrial.__init__(self, MakeTask(task_config), MakeAgents(rates), timesteps, rates["temperature"])
+
+
+class TrialCache:
+    """
+    The sweep's finished reward rows by (configuration, seed, timesteps), kept in a
+    result_store.ResultStore. store: the store or its directory.
+    """
+
+    def __init__(self, store):
+        from result_store import ResultStore
+
+        self.store = store if isinstance(store, ResultStore) else ResultStore(store)
+
+    def get(self, config, seed, timesteps):
+        return self.store.get(self.store.key(SweepTrial(config, timesteps), seed))
+
+    def put(self, config, seed, timesteps, rewards):
+        self.store.put(self.store.key(SweepTrial(config, timesteps), seed), rewards)
+
+
+def final_mean(rewards, fraction=0.25):
+    """
+    Default score: the mean reward per timestep over the last fraction of the timesteps,
+    averaged over the trials.
+    """
+    start = int(rewards.shape[1] * (1 - fraction))
+    return float(rewards[:, start:].mean())
+
+
+class SweepResult:
+    """
+    configs: the configurations, in the order given.
+    rungs: one dict per round, of the timesteps it ran, the index -> score of every
+        configuration it ran and the steps its trials simulated.
+    rewards: index -> (num_trials, timesteps) reward matrix of the configurations that ran for
+        the full timesteps.
+    steps: the steps simulated by every trial of every round (cached trials included).
+    """
+
+    def __init__(self, configs, rungs, rewards):
+        self.configs = configs
+        self.rungs = rungs
+        self.rewards = rewards
+
+    @property
+    def steps(self):
+        return sum(rung["steps"] for rung in self.rungs)
+
+    @property
+    def scores(self):
+        return self.rungs[-1]["scores"]
+
+    def ranking(self):
+        """
+        (config, score) of the configurations of the last round, best first.
+        """
+        scores = self.scores
+        return [(self.configs[i], scores[i]) for i in sorted(scores, key=scores.get, reverse=True)]
+
+    @property
+    def best(self):
+        return self.ranking()[0][0]
+
+
+def _run_round(configs, indices, timesteps, seeds, cache, workers):
+    jobs = [(SweepTrial(configs[i], timesteps), seed) for i in indices for seed in seeds]
+    rows = list(iter_jobs(jobs, workers, cache.store if cache is not None else None))
+    n = len(seeds)
+    return {i: np.stack(rows[k * n:(k + 1) * n]) for k, i in enumerate(indices)}
+
+
+def sweep(configs, timesteps, num_trials, seed=None, eta=None, min_timesteps=None, score=final_mean,
+          cache=None, workers=None):
+    """
+    Runs configs (a list of configuration dicts, see grid) and returns a SweepResult.
+
+    eta: None runs every configuration for timesteps. Otherwise successive halving: the first
+    round runs every configuration for timesteps / eta**r steps, r being the largest number of
+    rounds keeping that at least min_timesteps (default timesteps // 27), and each following
+    round keeps the best ceil(n / eta) configurations and multiplies the steps by eta. Each
+    round runs from t = 0 (see the module docstring), so with n configurations and R + 1
+    rounds the sweep simulates about (R + 1) * n * timesteps / eta**R steps per trial.
+    score: maps a (num_trials, timesteps) reward matrix to a number, higher being better.
+    cache: a TrialCache, a result_store.ResultStore or its directory, for finished trials.
+    workers: as in runner.iter_jobs.
+    """
+    if cache is not None and not isinstance(cache, TrialCache):
+        cache = TrialCache(cache)
+    seeds = trial_seeds(seed, num_trials)
+    if eta is None:
+        horizons = [timesteps]
+    else:
+        if min_timesteps is None:
+            min_timesteps = max(1, timesteps // 27)
+        rounds = 0
+        while timesteps / eta ** (rounds + 1) >= min_timesteps and math.ceil(len(configs) / eta ** (rounds + 1)) > 1:
+            rounds += 1
+        horizons = [int(timesteps / eta ** r) for r in range(rounds, 0, -1)] + [timesteps]
+
+    indices = list(range(len(configs)))
+    rungs = []
+    for r, horizon in enumerate(horizons):
+        rewards = _run_round(configs, indices, horizon, seeds, cache, workers)
+        scores = {i: score(rewards[i]) for i in indices}
+        rungs.append({"timesteps": horizon, "scores": scores, "steps": horizon * len(indices) * num_trials})
+        if r + 1 < len(horizons):
+            keep = math.ceil(len(indices) / eta)
+            indices = sorted(indices, key=scores.get, reverse=True)[:keep]
+    return SweepResult(configs, rungs, rewards)
@@ -0,0 +1,22 @@
+import warnings
+
+import pytest
+
+from agent import QLearner
+from HystereticQLearner import HystereticQLearner
+from schedules import Constant
+
+
+@pytest.fixture
+def make_learner():
+    """
+    make_learner(task, hysteretic=False, **options) builds a learner with constant rates
+    (learning 0.1, discount 0.9, exploration 0.1, decrease 0.01), without its warnings.
+    """
+    def make(task, hysteretic=False, **options):
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore")
+            if hysteretic:
+                return HystereticQLearner(task, Constant(0.1), Constant(0.1), Constant(0.9), Constant(0.01), **options)
+            return QLearner(task, Constant(0.1), Constant(0.1), Constant(0.9), **options)
+    return make
@@ -0,0 +1,69 @@
+import random
+
+import pytest
+
+from environment import PenaltyGame, Predator2
+from policy import epsilon_greedy
+from qtable import QTable
+from utils import find_greedy_action_for_state
+
+
+@pytest.mark.parametrize("hysteretic", [False, True])
+@pytest.mark.parametrize("lazy", [False, True])
+def test_greedy_action_follows_set_and_update(make_learner, hysteretic, lazy):
+    agent = make_learner(PenaltyGame(-100), hysteretic, policy=epsilon_greedy(0.0), dense=True, lazy=lazy)
+
+    def greedy():
+        action = agent.action_selection(0)
+        assert find_greedy_action_for_state(agent, 0) == action
+        return action
+
+    agent.set_q_value(0, "C", 1.0)
+    assert greedy() == "C"
+    agent.update(0, "B", 1, 20.0)
+    assert greedy() == "B"
+    # a negative TD error (at the decrease rate for the hysteretic learner) drops B below C
+    agent.update(0, "B", 1, -1000.0)
+    assert agent.get_q_value(0, "B") < 0
+    assert greedy() == "C"
+    agent.set_q_value(0, "A", 3.0)
+    assert greedy() == "A"
+
+
+def repeated_transitions(states, actions, vectorized):
+    rng = random.Random(0)
+    if vectorized:
+        # 16 pairs repeated 8 times: each repeat is one conflict-free run, and transition j
+        # reads the row transition j + 1 writes in the previous repeat
+        pairs = [(states[j], rng.choice(actions), states[min(j + 1, 15)]) for j in range(16)]
+        return [(state, action, new_state, rng.choice([10, 0, -100]))
+                for _ in range(8) for state, action, new_state in pairs]
+    # two states: nearly every transition repeats a pair or reads a row written just before
+    return [(rng.choice(states[:2]), rng.choice(actions), rng.choice(states[:2]), rng.choice([10, 0, -100]))
+            for _ in range(500)]
+
+
+@pytest.mark.parametrize("hysteretic", [False, True])
+@pytest.mark.parametrize("lazy", [False, True])
+@pytest.mark.parametrize("vectorized", [False, True])
+def test_update_batch_matches_update_with_repeated_pairs(make_learner, monkeypatch, hysteretic, lazy, vectorized):
+    task = Predator2()
+    states = list(task.get_state_space())[:16]
+    transitions = repeated_transitions(states, task.action_space, vectorized)
+    batched = make_learner(task, hysteretic, dense=True, lazy=lazy)
+    looped = make_learner(task, hysteretic, dense=True, lazy=lazy)
+    assert batched.discount_rate > 0
+
+    loops = []
+    update_loop = QTable._update_loop
+    monkeypatch.setattr(QTable, "_update_loop", lambda table, *args: loops.append(1) or update_loop(table, *args))
+    batched.update_batch(*zip(*transitions))
+    assert bool(loops) != vectorized
+    for transition in transitions:
+        looped.update(*transition)
+
+    for state in states:
+        for action in task.action_space:
+            assert batched.get_q_value(state, action) == pytest.approx(looped.get_q_value(state, action))
+    assert batched.td_error == pytest.approx(looped.td_error)
+    assert batched.accumulated_reward == looped.accumulated_reward
@@ -0,0 +1,23 @@
+import numpy as np
+
+from experiment import run_spec
+
+
+def test_backends_agree_on_a_scheduled_spec():
+    spec = {
+        "environment": {"class": "PenaltyGame", "args": {"k": -100}},
+        "agents": [{"class": "HystereticQLearner", "count": 2, "learning_rate": 0.1, "decrease_rate": 0.01,
+                    "discount_rate": 0, "exploration_rate": {"schedule": "Exponential", "args": [1.0, 0.99]}}],
+        "trials": 200, "timesteps": 300, "seed": 0,
+    }
+    batch, _ = run_spec(spec, "batch", workers=1)
+    simulate, _ = run_spec(spec, "simulate", workers=1)
+    for rewards in (batch, simulate):
+        # exploration decays from 1: the agents stop choosing the -100 penalties
+        assert rewards[:, :50].mean() < -10 < 0 < rewards[:, -100:].mean()
+
+    # the mean reward of every 50 steps agrees within 4 standard errors
+    for start in range(0, 300, 50):
+        means = [rewards[:, start:start + 50].mean(axis=1) for rewards in (batch, simulate)]
+        error = np.sqrt(sum(m.var() / len(m) for m in means))
+        assert abs(means[0].mean() - means[1].mean()) < 4 * error
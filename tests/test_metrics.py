@@ -0,0 +1,31 @@
+import numpy as np
+
+from metrics import ChunkedWriter, P2Quantile, load_chunks
+
+
+def test_chunked_writer_shrinks_the_last_chunk(tmp_path):
+    writer = ChunkedWriter(str(tmp_path), chunk_size=100)
+    for t in range(250):
+        writer.record(t, 1.0, (0, 1), None, (0.0, 0.0), t % 7 == 0)
+    writer.close()
+    chunks = load_chunks(str(tmp_path))
+    assert [len(chunk) for chunk in chunks["t"]] == [100, 100, 50]
+    assert np.concatenate(chunks["t"]).tolist() == list(range(250))
+
+
+def test_median_of_discrete_rewards_is_a_reward():
+    rng = np.random.default_rng(0)
+    rows = rng.choice([-50.0, 0.0, 10.0], size=(101, 8))
+    median = P2Quantile(shape=(8,))
+    for row in rows:
+        median.add(row)
+    assert np.array_equal(median.value, np.median(rows, axis=0))
+
+
+def test_median_of_continuous_values_is_estimated():
+    values = np.random.default_rng(0).normal(size=5000)
+    median = P2Quantile()
+    for value in values:
+        median.add(value)
+    assert median.level_counts is None
+    assert abs(median.value - np.median(values)) < 0.05
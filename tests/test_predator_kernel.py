@@ -0,0 +1,8 @@
+from predator_kernel import verify_against_predator2
+
+
+def test_kernel_matches_predator2():
+    # a twentieth of the default Predator2 samples and a tenth of the batch ones: the sampling
+    # noise is about 0.027 instead of 0.006, and a 0.25 instead of 0.2 chance of slipping
+    # already gives 0.055
+    assert verify_against_predator2(samples=10000, batch_samples=100000, tolerance=0.045) <= 0.045
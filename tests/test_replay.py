@@ -0,0 +1,17 @@
+from environment import Predator2
+from replay import ReplayBuffer, collect_predator_experience, train_offline
+
+
+def test_train_offline_on_empty_buffer(make_learner):
+    task = Predator2()
+    learners = [make_learner(task, hysteretic=True, encoded=True) for _ in range(2)]
+    train_offline(learners, ReplayBuffer(10), epochs=2, batch_size=4, shuffle=True)
+    assert not learners[0].q_table.array.any()
+
+
+def test_train_offline_learns_from_the_buffer(make_learner):
+    task = Predator2()
+    learners = [make_learner(task, hysteretic=True, encoded=True) for _ in range(2)]
+    buffer = collect_predator_experience(ReplayBuffer(1000), 10, 20, rng=0)
+    train_offline(learners, buffer, batch_size=64)
+    assert learners[0].q_table.array.any()
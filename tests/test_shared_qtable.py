@@ -0,0 +1,44 @@
+import multiprocessing
+import pickle
+
+import pytest
+
+from shared_qtable import SharedQStore
+
+
+def _claim(store, barrier, results):
+    barrier.wait()
+    try:
+        store.claim(0)
+        results.put(True)
+    except RuntimeError:
+        results.put(False)
+    # stay alive, and the owner, until every process has tried
+    barrier.wait()
+
+
+@pytest.mark.parametrize("method", ["fork", "spawn"])
+def test_one_process_claims_a_table(method):
+    context = multiprocessing.get_context(method)
+    num_processes = 8
+    barrier = context.Barrier(num_processes)
+    results = context.Queue()
+    with SharedQStore(2, 4, 3, context=context) as store:
+        processes = [context.Process(target=_claim, args=(store, barrier, results)) for _ in range(num_processes)]
+        for process in processes:
+            process.start()
+        claimed = [results.get(timeout=30) for _ in processes]
+        for process in processes:
+            process.join()
+    assert claimed.count(True) == 1
+
+
+def test_store_pickled_outside_process_start_cannot_claim():
+    with SharedQStore(1, 4, 3) as store:
+        opened = pickle.loads(pickle.dumps(store))
+        try:
+            assert opened.values.shape == (1, 4, 3)
+            with pytest.raises(RuntimeError):
+                opened.claim(0)
+        finally:
+            opened.close()
@@ -0,0 +1,46 @@
+import pytest
+
+from agent import QLearner
+from environment import GridWorld
+from schedules import Constant, Exponential
+from utils import simulate_task
+
+
+@pytest.mark.parametrize("encoded", [False, True])
+@pytest.mark.parametrize("compiled", [False, True])
+def test_one_agent_grid_world(make_learner, encoded, compiled):
+    task = GridWorld(5, (0, 0), [(4, 4)])
+    if compiled:
+        task = task.compile()
+    agent = make_learner(task, encoded=encoded)
+    t = 0
+    episodes = 0
+    while t < 2000:
+        task.reset_state()
+        t, _ = simulate_task([agent], task, t, timesteps=2000, encoded=encoded)
+        episodes += 1
+    assert episodes > 1
+    start = task.encode_state((0, 0)) if encoded else (0, 0)
+    assert agent.get_max_q_value(start) != 0
+
+
+class RecordedExponential(Exponential):
+    def __init__(self, *args):
+        Exponential.__init__(self, *args)
+        self.values = []
+
+    def value(self, t):
+        self.values.append(Exponential.value(self, t))
+        return self.values[-1]
+
+
+def test_rate_schedules_follow_the_timestep():
+    task = GridWorld(5, (0, 0), [(4, 4)])
+    exploration = RecordedExponential(1.0, 0.99)
+    learning = RecordedExponential(0.5, 0.99)
+    agent = QLearner(task, exploration, learning, Constant(0.9))
+    t, _ = simulate_task([agent], task, 0, timesteps=300)
+    assert t > 1
+    # one exploration and one learning rate per step, decaying with t
+    assert exploration.values == pytest.approx([0.99 ** step for step in range(t)])
+    assert learning.values == pytest.approx([0.5 * 0.99 ** step for step in range(t)])
@@ -1,43 +1,114 @@
-from typing import List
-from agent import Agent
-from environment import Environment
-from math import e
+from math import nan
+
+# only for the annotations; importing typing takes about 10ms, more than agent, environment,
+# policy and utils take together (see the startup benchmarks)
+TYPE_CHECKING = False
+if TYPE_CHECKING:
+    from typing import List
+    from agent import Agent
+    from environment import Environment
 
 # system_temperature should NOT be None if it will be used in the agent#action_selection method.
 
 
-def simulate_task(agents: List[Agent], task: Environment, t=0, system_temperature=None, timesteps=1000, update_agents=True, return_acc_reward=False):
-    state = task.start_state() if callable(task.start_state) else task.start_state
+def simulate_task(agents: "List[Agent]", task: "Environment", t=0, system_temperature=None, timesteps=1000, update_agents=True, return_acc_reward=False, encoded=False, metrics=None, replay=None, profiler=None):
+    """
+    encoded: if True, states and actions are the task's integer codes (see Environment.encode_state),
+    and the agents must have been built with encoded=True.
+    metrics: a recorder from metrics.py; every step's reward, joint action, temperature and
+    TD errors are passed to its record method.
+    replay: a replay.ReplayBuffer every transition is added to.
+    profiler: a profiling.Profiler timing each step's action selection, response, update and
+    bookkeeping.
+
+    agents is a list of any number of agents, or a multiagent.AgentGroup, which chooses and
+    updates all the agents' actions in one batched call each. A single-agent task (num_agents
+    == 1, e.g. GridWorld) is given the agent's action itself rather than a joint action.
+
+    system_temperature is a number, multiplied by 0.99 after every step, or a schedule of t
+    (see schedules.py), in which case the returned temperature is the schedule itself.
+
+    The agents are given the timestep t: action_selection(state, None, T, t=t) passes it on to
+    the policy (e.g. for an exploration rate schedule) and update(..., t) to the rate schedules.
+    """
+    if(encoded):
+        state = task.encoded_start_state()
+        is_terminal = task.is_terminal_encoded
+        respond_to_action = task.respond_to_action_encoded
+    else:
+        state = task.start_state() if callable(task.start_state) else task.start_state
+        is_terminal = task.isTerminalState
+        respond_to_action = task.respond_to_action
     
     T = system_temperature
+    temperature_schedule = system_temperature if callable(system_temperature) else None
+    acc_reward = 0
+    if(metrics is not None and not encoded):
+        action_space = task.get_action_space()
+        action_codes = {} if callable(action_space) else {action: i for i, action in enumerate(action_space)}
 
-    def action_lambda(a: Agent, s, T, idx):
-        #         print("agent {}".format(idx))
-        return a.action_selection(s, None, T)
+    group = agents if hasattr(agents, "act") else None
+    single_agent = task.num_agents == 1
+    if(profiler is not None):
+        from profiling import BOOKKEEPING, RESPOND, SELECT, UPDATE
 
-    while not task.isTerminalState(state) and t < timesteps:
-        acc_reward = 0
-#         actions = tuple((lambda a: a.action_selection(state, None, T), agents))
-        actions = tuple((action_lambda(agent, state, T, idx)
-                        for idx, agent in enumerate(agents)))
-        if(T is not None):
+    while not is_terminal(state) and t < timesteps:
+        if(profiler is not None):
+            mark = profiler.start_step()
+        if(temperature_schedule is not None):
+            T = temperature_schedule(t)
+        if(profiler is not None):
+            mark = profiler.lap(BOOKKEEPING, mark)
+        if(group is not None):
+            actions = group.act(state, T, t=t)
+        else:
+            actions = tuple([agent.action_selection(state, None, T, t=t) for agent in agents])
+        if(profiler is not None):
+            mark = profiler.lap(SELECT, mark)
+        temperature = T
+        if(T is not None and temperature_schedule is None):
             T = T * 0.99
             # T = T * (e**(-0.003))
-        reward, new_state = task.respond_to_action(actions)
+        if(profiler is not None):
+            mark = profiler.lap(BOOKKEEPING, mark)
+        reward, new_state = respond_to_action(actions[0] if single_agent else actions)
+        if(profiler is not None):
+            mark = profiler.lap(RESPOND, mark)
         if(return_acc_reward):
             acc_reward += reward
 #         print("reward: {}".format(reward))
         if(update_agents):
             # allows us to perform a greedy trial to evaluate agents
-            agents[0].update(state, actions[0], new_state, reward)  # , t)
-            agents[1].update(state, actions[1], new_state, reward)  # , t)
+            if(group is not None):
+                group.update(state, actions, new_state, reward, t)
+            else:
+                for agent, action in zip(agents, actions):
+                    agent.update(state, action, new_state, reward, t)
+        if(profiler is not None):
+            mark = profiler.lap(UPDATE, mark)
+
+        if(replay is not None):
+            replay.add(state, actions, reward, new_state, is_terminal(new_state))
+
+        if(metrics is not None):
+            codes = actions if encoded else tuple(action_codes.get(action, -1) for action in actions)
+            td_errors = tuple(getattr(agent, "td_error", nan) if update_agents else nan for agent in agents)
+            metrics.record(t, reward, codes, temperature, td_errors, is_terminal(new_state))
+        if(profiler is not None):
+            profiler.end_step(t, mark, agents)
 
         state = new_state
         t += 1
+    if(temperature_schedule is not None):
+        T = temperature_schedule
     if(return_acc_reward):
         return t, T, acc_reward
     else:
         return t, T
 
 def find_greedy_action_for_state(agent, state):
-    return max(agent.q_values[state], key=agent.q_values[state].get)
\ No newline at end of file
+    q_table = getattr(agent, "q_table", None)
+    if(q_table is not None):
+        # cached by the table; the first greedy action, like max() below
+        return q_table.actions[q_table.greedy_index(state, break_ties=False)]
+    return max(agent.q_values[state], key=agent.q_values[state].get)